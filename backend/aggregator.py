@@ -0,0 +1,216 @@
+import os
+import socket
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import datetime
+
+import config
+from products import as_record
+from sheets_handler import FIELD_LABELS, SheetTableWriter
+from sheets_writer import get_writer
+
+
+class ShopAggregator:
+    """
+    Shop-wide totals per item across every tracked session
+    Each session's latest counters per item are remembered, so a scrape only
+    applies the difference for items whose counters moved: to the item's
+    total, to the shop total and to one sorted index per metric. Updates cost
+    O(changed items) and leaderboards are read straight off the indexes.
+    Counters of sessions that have stopped keep counting towards the totals
+    """
+
+    def __init__(self, metric_fields=None, top_n=None):
+        self.metrics = list(metric_fields or config.AGGREGATE_METRICS)
+        self.top_n = top_n or config.AGGREGATE_TOP_N
+        self.lock = threading.Lock()
+        # session_id -> {item key: tuple of metric values last seen}
+        self.contributions = {}
+        # item key -> {'title', 'values': [per metric], 'sessions': set}
+        self.items = {}
+        self.totals = [0] * len(self.metrics)
+        # metric -> [(-total, item key), ...] kept sorted, best first
+        self.rankings = {metric: [] for metric in self.metrics}
+        # Bumped whenever a total changes, so exporters can skip idle periods
+        self.version = 0
+        self.updated = None
+
+    def update(self, session_id, products):
+        """
+        Fold products into the totals; returns the number of items that moved
+        Passing only a delta's touched products is enough, since each
+        session's previous counters are remembered here
+        """
+        changed = 0
+        with self.lock:
+            seen = self.contributions.setdefault(session_id, {})
+            for product in products:
+                product = as_record(product)
+                key = product.key
+                values = tuple(product.get(metric) or 0 for metric in self.metrics)
+                previous = seen.get(key)
+                if previous == values:
+                    continue
+                seen[key] = values
+                self._apply(session_id, key, product.title, previous, values)
+                changed += 1
+            if changed:
+                self.version += 1
+                self.updated = datetime.now().isoformat(timespec='seconds')
+        return changed
+
+    def _apply(self, session_id, key, title, previous, values):
+        """Caller holds the lock"""
+        item = self.items.get(key)
+        if item is None:
+            item = self.items[key] = {'title': title, 'values': [0] * len(self.metrics), 'sessions': set()}
+            for ranking in self.rankings.values():
+                insort(ranking, (0, key))
+        item['sessions'].add(session_id)
+        if title:
+            item['title'] = title
+
+        for index, metric in enumerate(self.metrics):
+            delta = values[index] - (previous[index] if previous else 0)
+            if not delta:
+                continue
+            old = item['values'][index]
+            item['values'][index] = old + delta
+            self.totals[index] += delta
+            ranking = self.rankings[metric]
+            del ranking[bisect_left(ranking, (-old, key))]
+            insort(ranking, (-item['values'][index], key))
+
+    def leaderboard(self, metric, n=None):
+        """Top n items by metric"""
+        n = n or self.top_n
+        with self.lock:
+            return [self._item(key) for _, key in self.rankings[metric][:n]]
+
+    def _item(self, key):
+        """Caller holds the lock"""
+        item = self.items[key]
+        entry = {'itemId': key, 'title': item['title'], 'sessions': len(item['sessions'])}
+        entry.update(zip(self.metrics, item['values']))
+        return entry
+
+    def summary(self, n=None):
+        """Shop totals and a leaderboard per metric"""
+        with self.lock:
+            totals = dict(zip(self.metrics, self.totals))
+            counts = {'items': len(self.items), 'sessions': len(self.contributions)}
+            updated = self.updated
+        return {
+            'totals': totals,
+            'itemCount': counts['items'],
+            'sessionCount': counts['sessions'],
+            'lastUpdate': updated,
+            'leaderboards': {metric: self.leaderboard(metric, n) for metric in self.metrics}
+        }
+
+    def rows(self):
+        """Sheet rows: a shop total row, then every item by the first metric, best first"""
+        with self.lock:
+            rows = [['TOTAL', '', len(self.contributions)] + list(self.totals)]
+            for _, key in self.rankings[self.metrics[0]]:
+                item = self.items[key]
+                rows.append([key, item['title'], len(item['sessions'])] + item['values'])
+        return rows
+
+    def headers(self):
+        return ['Item ID', 'Title', 'Sessions'] + [FIELD_LABELS.get(metric, metric) for metric in self.metrics]
+
+
+# Broker lease held by the API process that writes the summary tab
+EXPORT_LEASE = 'aggregate-export'
+
+
+class AggregateSheetExporter:
+    """
+    Rewrites the shop-wide summary tab every interval seconds while totals change
+    With a broker (worker mode, several API processes holding the same
+    totals) only the process holding the export lease writes; the lease
+    lasts three intervals, so another process takes over if it goes away
+    """
+
+    def __init__(self, aggregator, sheet_url, title=None, interval=None, writer=None, service=None,
+                 broker=None):
+        self.aggregator = aggregator
+        self.interval = interval or config.AGGREGATE_WRITE_INTERVAL
+        self.broker = broker
+        self.owner = f'{socket.gethostname()}-{os.getpid()}'
+        self.leader = broker is None
+        self.table = SheetTableWriter(sheet_url, title or config.AGGREGATE_SHEET_TAB,
+                                      aggregator.headers(), writer=writer or get_writer(),
+                                      service=service)
+        self.stopping = threading.Event()
+        self.thread = None
+        self._written_version = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='aggregate-export', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stopping.wait(self.interval):
+            self.export()
+
+    def export(self):
+        if not self._lead():
+            return
+        version = self.aggregator.version
+        if version == self._written_version:
+            return
+        try:
+            started = time.monotonic()
+            rows = self.aggregator.rows()
+            if self.table.write_rows(rows):
+                self._written_version = version
+                print(f"Wrote {len(rows) - 1} items to {self.table.title} "
+                      f"in {time.monotonic() - started:.2f}s")
+        except Exception as e:
+            print(f"Error exporting shop totals: {str(e)}")
+
+    def _lead(self):
+        """Claim or renew the export lease; True if this process should write"""
+        if self.broker is None:
+            return True
+        try:
+            held = self.broker.claim_lease(EXPORT_LEASE, self.owner, self.interval * 3)
+        except Exception as e:
+            print(f"Error claiming the shop totals export: {str(e)}")
+            held = False
+        if held and not self.leader:
+            print(f"{self.owner} now writes {self.table.title}")
+            # Rewrite the whole tab (and clear leftovers) on the first write
+            self.table.reset()
+            self._written_version = None
+        self.leader = held
+        return held
+
+    def stop(self):
+        """Stop the loop and queue a last write with the final totals"""
+        self.stopping.set()
+        if self.thread:
+            self.thread.join(timeout=self.interval)
+        self.export()
+        if self.broker is not None and self.leader:
+            try:
+                self.broker.release_lease(EXPORT_LEASE, self.owner)
+                self.leader = False
+            except Exception as e:
+                print(f"Error releasing the shop totals export: {str(e)}")
+
+
+_aggregator = None
+_aggregator_lock = threading.Lock()
+
+
+def get_aggregator():
+    """Process-wide shop aggregator"""
+    global _aggregator
+    with _aggregator_lock:
+        if _aggregator is None:
+            _aggregator = ShopAggregator()
+        return _aggregator
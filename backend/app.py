@@ -1,11 +1,24 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory
 from flask_cors import CORS
+import os
+import signal
 import threading
 import time
-import os
 
+from aggregator import AggregateSheetExporter, get_aggregator
+from browser_pool import get_pool
+from broker import get_broker
+from bulk_start import BulkStarter
+from google_client import warm_up
+from history_store import get_history_store
+from live_feed import get_live_feed
+from preview_cache import PreviewCache
+from products import as_record
+import config
+import metrics
 from scraper import ShopeeStreamScraper
-from sheets_handler import GoogleSheetsHandler
+from sheets_writer import get_writer
+from tracker import SessionTracker, BrokerTracker
 
 # Configure Flask to serve frontend
 app = Flask(__name__, 
@@ -13,8 +26,19 @@ app = Flask(__name__,
             static_url_path='')
 CORS(app)
 
-# Store active scrapers
-active_scrapers = {}
+# Tracked sessions: run in this process, or handed to worker processes
+tracker = BrokerTracker() if config.WORKER_MODE else SessionTracker()
+
+# Background start-up for bulk requests; in worker mode jobs are shared through
+# the broker, since a progress poll may reach another API process
+bulk_starter = BulkStarter(tracker, broker=get_broker() if config.WORKER_MODE else None)
+
+# Recent preview results, shared by concurrent preview requests
+preview_cache = PreviewCache()
+
+# Authenticate with Google once, before the first session needs it
+if not config.WORKER_MODE:
+    warm_up()
 
 # ============================================
 # FRONTEND ROUTES
@@ -54,45 +78,49 @@ def start_tracking():
             return jsonify({'error': 'Missing sessionId or sheetUrl'}), 400
         
         # Check if already tracking this session
-        if session_id in active_scrapers:
+        if tracker.is_tracking(session_id):
             return jsonify({'error': 'Already tracking this session'}), 400
         
-        # Initialize scraper and sheets handler
-        scraper = ShopeeStreamScraper(session_id)
-        sheets_handler = GoogleSheetsHandler(sheet_url)
-        
-        # Store the scraper
-        active_scrapers[session_id] = {
-            'scraper': scraper,
-            'sheets_handler': sheets_handler,
-            'running': True
-        }
-        
-        # Start scraping in background thread
-        def scrape_loop():
-            while active_scrapers.get(session_id, {}).get('running', False):
-                try:
-                    # Scrape products
-                    products = scraper.scrape_products()
-                    
-                    # Update Google Sheets
-                    if products:
-                        sheets_handler.update_products(products)
-                    
-                    # Wait before next scrape (30 seconds)
-                    time.sleep(30)
-                except Exception as e:
-                    print(f"Error in scrape loop: {str(e)}")
-                    time.sleep(10)
-        
-        thread = threading.Thread(target=scrape_loop, daemon=True)
-        thread.start()
+        # Initialize scraper and sheets handler, then hand the session to the scheduler
+        tracker.start(session_id, sheet_url)
         
         return jsonify({
             'message': 'Tracking started successfully',
             'sessionId': session_id
         })
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/start-tracking/bulk', methods=['POST'])
+def start_tracking_bulk():
+    """Validate a list of sessions and start them in the background"""
+    try:
+        data = request.json or {}
+        
+        # sheetUrl at the top level applies to entries without their own
+        job = bulk_starter.submit(data.get('sessions'), data.get('sheetUrl'))
+        
+        return jsonify(job), 202
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Per-session progress of a bulk start"""
+    try:
+        job = bulk_starter.job(job_id)
+        
+        if job is None:
+            return jsonify({'error': 'Unknown job'}), 404
+        
+        return jsonify(job)
+        
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -106,16 +134,16 @@ def stop_tracking():
         if not session_id:
             return jsonify({'error': 'Missing sessionId'}), 400
         
-        if session_id not in active_scrapers:
+        if not tracker.is_tracking(session_id):
             return jsonify({'error': 'Session not being tracked'}), 404
         
         # Stop the scraper
-        active_scrapers[session_id]['running'] = False
-        active_scrapers[session_id]['scraper'].close()
-        del active_scrapers[session_id]
+        tracker.stop(session_id)
         
         return jsonify({'message': 'Tracking stopped successfully'})
         
+    except KeyError:
+        return jsonify({'error': 'Session not being tracked'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -123,46 +151,209 @@ def stop_tracking():
 def get_status(session_id):
     """Get tracking status for a session"""
     try:
-        if session_id not in active_scrapers:
-            return jsonify({'tracking': False})
-        
-        scraper_data = active_scrapers[session_id]
-        
-        return jsonify({
-            'tracking': True,
-            'running': scraper_data['running'],
-            'lastUpdate': scraper_data.get('lastUpdate', None)
-        })
+        return jsonify(tracker.status(session_id))
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _scrape_preview(session_id):
+    """One-off scrape for a session that is not being tracked"""
+    # Pool tabs are keyed by lease; never reuse (and then close) a tracked session's tab
+    scraper = ShopeeStreamScraper(session_id, lease_key=f'preview:{session_id}')
+    try:
+        return scraper.scrape_products()
+    finally:
+        scraper.close()
+
 @app.route('/api/preview/<session_id>', methods=['GET'])
 def preview_data(session_id):
     """Preview data for a session without starting tracking"""
     try:
-        scraper = ShopeeStreamScraper(session_id)
-        products = scraper.scrape_products()
-        scraper.close()
+        # A tracked session already scrapes on schedule; reuse its latest result,
+        # which is empty until its first cycle has finished
+        if tracker.is_tracking(session_id):
+            products = tracker.latest_products(session_id) or []
+        else:
+            products = preview_cache.get(session_id, lambda: _scrape_preview(session_id))
         
         return jsonify({
-            'products': products,
+            'products': [as_record(product).to_dict() for product in products or []],
             'count': len(products) if products else 0
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/stream/<session_id>', methods=['GET'])
+def stream_updates(session_id):
+    """Server-Sent Events feed of scrape results and per-item deltas"""
+    return Response(
+        get_live_feed().stream(session_id),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@app.route('/api/history/<session_id>', methods=['GET'])
+def get_history(session_id):
+    """Per-product metric history for a session"""
+    try:
+        item_id = request.args.get('item')
+        start = request.args.get('from', type=int)
+        end = request.args.get('to', type=int)
+        step = request.args.get('step', type=int)
+        
+        history = get_history_store().query(session_id, item_id, start, end, step)
+        
+        return jsonify({
+            'sessionId': session_id,
+            'items': history
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/aggregate', methods=['GET'])
+def get_aggregate():
+    """Shop-wide totals and leaderboards across every tracked session"""
+    try:
+        top = request.args.get('top', type=int)
+        metric = request.args.get('metric')
+        aggregator = get_aggregator()
+        
+        if metric:
+            if metric not in aggregator.metrics:
+                return jsonify({'error': f'Unknown metric {metric}'}), 400
+            return jsonify({'metric': metric, 'items': aggregator.leaderboard(metric, top)})
+        
+        return jsonify(aggregator.summary(top))
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus metrics"""
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/pool/stats', methods=['GET'])
+def pool_stats():
+    """Browser pool statistics"""
+    try:
+        return jsonify(get_pool().stats())
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/workers', methods=['GET'])
+def list_workers():
+    """Scrape workers known to the broker (worker mode only)"""
+    try:
+        if not config.WORKER_MODE:
+            return jsonify({'workerMode': False, 'workers': []})
+        
+        return jsonify({'workerMode': True, 'workers': tracker.workers()})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# ============================================
+# LIFECYCLE
+# ============================================
+
+_shutdown_lock = threading.Lock()
+_shut_down = False
+_aggregate_exporter = None
+
+def start_services():
+    """
+    Resume persisted sessions and start the shop totals export; called once
+    by whichever server runs the app
+    """
+    global _aggregate_exporter
+    if not config.WORKER_MODE:
+        tracker.resume()
+    if config.AGGREGATE_SHEET_URL:
+        # Every API process holds the same totals; in worker mode one of them writes the tab
+        _aggregate_exporter = AggregateSheetExporter(
+            get_aggregator(), config.AGGREGATE_SHEET_URL,
+            broker=get_broker() if config.WORKER_MODE else None
+        )
+        _aggregate_exporter.start()
+
+def shutdown(timeout=None):
+    """
+    Stop scheduling, flush pending Sheets writes and quit every browser
+    within timeout seconds (default SHUTDOWN_TIMEOUT); safe to call twice
+    """
+    global _shut_down
+    with _shutdown_lock:
+        if _shut_down:
+            return
+        _shut_down = True
+    
+    timeout = config.SHUTDOWN_TIMEOUT if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    print(f"Shutting down (deadline {timeout}s)...")
+    
+    # End open live feeds so their server threads are free to exit
+    get_live_feed().close_all()
+    bulk_starter.shutdown()
+    if _aggregate_exporter:
+        # Queue the final totals before the Sheets queue is flushed
+        _aggregate_exporter.stop()
+    tracker.shutdown(timeout=timeout)
+    if config.WORKER_MODE:
+        # Workers flush their own sessions; only the shop totals are queued here
+        get_writer().stop(timeout=max(0, deadline - time.monotonic()))
+        # Browsers opened for previews; SessionTracker.shutdown quits them otherwise
+        get_pool().shutdown(timeout=max(0, deadline - time.monotonic()))
+    print("Shutdown complete")
+
+def install_signal_handlers():
+    """Run shutdown() on SIGTERM and SIGINT, then hand over to the previous handler"""
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        previous = signal.getsignal(signum)
+        
+        def handler(signum, frame, previous=previous):
+            shutdown()
+            if callable(previous):
+                previous(signum, frame)
+            else:
+                raise SystemExit(0)
+        
+        signal.signal(signum, handler)
+
 if __name__ == '__main__':
     print("=" * 50)
     print("Letu Live Tracker Backend Starting...")
     print("=" * 50)
-    print(f"Server running at: http://localhost:5000")
+    print(f"Server running at: http://localhost:{config.FLASK_PORT}")
     print(f"API Endpoints:")
     print(f"  - GET  /api/health")
     print(f"  - POST /api/start-tracking")
+    print(f"  - POST /api/start-tracking/bulk")
+    print(f"  - GET  /api/jobs/<job_id>")
     print(f"  - POST /api/stop-tracking")
     print(f"  - GET  /api/status/<session_id>")
     print(f"  - GET  /api/preview/<session_id>")
+    print(f"  - GET  /api/stream/<session_id>")
+    print(f"  - GET  /api/history/<session_id>")
+    print(f"  - GET  /api/aggregate")
+    print(f"  - GET  /api/pool/stats")
+    print(f"  - GET  /api/workers")
+    print(f"  - GET  /metrics")
     print("=" * 50)
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    print("Development server; use `gunicorn -c gunicorn.conf.py wsgi:app` in production")
+    print("=" * 50)
+    
+    start_services()
+    install_signal_handlers()
+    try:
+        # The reloader would run a second copy of the scheduler and browsers
+        app.run(debug=config.FLASK_DEBUG, use_reloader=False,
+                host=config.FLASK_HOST, port=config.FLASK_PORT)
+    finally:
+        shutdown()
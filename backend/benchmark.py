@@ -0,0 +1,263 @@
+"""
+Offline benchmark for the scrape and Google Sheets path
+Replays recorded productList and performance-log fixtures through
+ShopeeStreamScraper's parsing path, and drives GoogleSheetsHandler against a
+local fake Sheets server that counts calls and can simulate 429s.
+No Chrome, Shopee or Google access is needed.
+
+Usage:
+    python benchmark.py
+    python benchmark.py --sessions 1,10,100 --cycles 5 --quota-every 7 --mode log
+"""
+
+import argparse
+import copy
+import gc
+import json
+import os
+import random
+import statistics
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from change_detector import ChangeDetector
+import config
+from fake_sheets_server import FakeSheetsServer
+from network_capture import COLLECT_SCRIPT
+from products import ProductRecord
+from scraper import ShopeeStreamScraper
+from sheets_handler import GoogleSheetsHandler
+from sheets_writer import SheetsWriteQueue
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as f:
+        return json.load(f)
+
+
+class ReplayDriver:
+    """Stands in for a WebDriver tab, answering from recorded fixtures"""
+
+    current_window_handle = 'replay'
+    window_handles = ['replay']
+
+    def __init__(self, session_id, body, performance_log, mode, noise):
+        self.session_id = session_id
+        self.mode = mode
+        self.body = body
+        self.body_text = json.dumps(body)
+        self.product_list_url = performance_log['productListUrl'].replace('__SESSION_ID__', session_id)
+        self.request_id = performance_log['productListRequestId']
+        entries = [
+            {**entry, 'message': entry['message'].replace('__SESSION_ID__', session_id)}
+            for entry in performance_log['entries']
+        ]
+        # Pad the log with unrelated page traffic ahead of the productList response
+        self.entries = entries[:-3] * noise + entries[-3:]
+
+    def tick(self, change_ratio):
+        """Advance the recorded counters as if the stream went on"""
+        for product in self.body['data']['list']:
+            if random.random() < change_ratio:
+                product['productClicks'] += random.randint(1, 20)
+                if random.random() < 0.3:
+                    product['ordersCreated'] += 1
+                    product['itemsSold'] += 1
+                    product['revenue'] += product['minPrice']
+        self.body_text = json.dumps(self.body)
+
+    def get(self, url):
+        pass
+
+    def execute_cdp_cmd(self, cmd, params):
+        if cmd == 'Network.getResponseBody':
+            return {'body': self.body_text}
+        return {}
+
+    def execute_script(self, script, *args):
+        if script == COLLECT_SCRIPT:
+            if self.mode != 'capture':
+                return None
+            return [{'page': '0', 'url': self.product_list_url, 'body': self.body_text, 'seq': 1}]
+        if 'navigator.userAgent' in script:
+            return 'ReplayDriver'
+        return None
+
+    def get_log(self, kind):
+        return self.entries
+
+    def get_cookies(self):
+        return []
+
+
+class ReplayLease:
+    def __init__(self, driver):
+        self.driver = driver
+
+    @contextmanager
+    def use(self):
+        yield self.driver
+
+
+class ReplayPool:
+    """Browser pool stand-in handing out replay drivers"""
+
+    def __init__(self, make_driver):
+        self.make_driver = make_driver
+
+    def acquire(self, session_id):
+        return ReplayLease(self.make_driver(session_id))
+
+    def release(self, lease):
+        pass
+
+
+def run_scale(sessions, args, product_list, performance_log):
+    server = FakeSheetsServer(quota_every=args.quota_every).start()
+    service = server.build_service()
+    writer = SheetsWriteQueue(
+        requests_per_minute=args.writes_per_minute,
+        burst=args.writes_per_minute,
+        retry_delay=0.05,
+        max_backoff=1
+    )
+
+    # Replay drivers hold fixture copies; build them up front so they don't count as session memory
+    session_ids = [str(29060000 + n) for n in range(sessions)]
+    drivers = {
+        session_id: ReplayDriver(session_id, copy.deepcopy(product_list), performance_log,
+                                 args.mode, args.noise)
+        for session_id in session_ids
+    }
+
+    # Warm up lazily built client resources and the writer thread
+    warm_up = GoogleSheetsHandler('https://docs.google.com/spreadsheets/d/bench-warm-up/edit',
+                                  writer=writer, service=service)
+    warm_up.update_products([ProductRecord.from_dict({'itemId': 1})])
+    warm_up.update_products([ProductRecord.from_dict({'itemId': 1, 'productClicks': 1})])
+    writer.flush(timeout=10)
+    server.calls.clear()
+
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.take_snapshot()
+    pool = ReplayPool(drivers.get)
+    scrapers = []
+    handlers = []
+    detectors = []
+    for n, session_id in enumerate(session_ids):
+        sheet = f'https://docs.google.com/spreadsheets/d/bench-sheet-{n // args.sessions_per_sheet}/edit'
+        scrapers.append(ShopeeStreamScraper(session_id, pool=pool))
+        handlers.append(GoogleSheetsHandler(sheet, writer=writer, service=service,
+                                            session_id=session_id))
+        detectors.append(ChangeDetector(session_id))
+
+    parse_times = []
+    cycle_times = []
+    steady_calls = 0
+    product_count = 0
+    for cycle in range(args.cycles):
+        calls_before = server.total_calls()
+        for scraper, handler, detector in zip(scrapers, handlers, detectors):
+            driver = scraper.lease.driver
+            if cycle:
+                driver.tick(args.change_ratio)
+
+            started = time.perf_counter()
+            with scraper.lease.use() as scraper.driver:
+                products = scraper._extract_from_network_logs()
+            parsed = time.perf_counter()
+            handler.apply_delta(detector.detect(products))
+            finished = time.perf_counter()
+
+            scraper.driver = None
+            product_count = len(products)
+            # The first cycle writes every row synchronously; time steady state only
+            if cycle:
+                parse_times.append(parsed - started)
+                cycle_times.append(finished - started)
+        writer.flush(timeout=60)
+
+        if cycle == 0:
+            gc.collect()
+            snapshot = tracemalloc.take_snapshot()
+            memory = sum(stat.size_diff for stat in snapshot.compare_to(baseline, 'filename'))
+            # Tracing slows everything down, so stop before timing
+            tracemalloc.stop()
+        else:
+            steady_calls += server.total_calls() - calls_before
+
+    writer.stop(timeout=10)
+    server.stop()
+
+    steady_cycles = args.cycles - 1
+    return {
+        'sessions': sessions,
+        'products': product_count,
+        'parse_ms': statistics.mean(parse_times) * 1000,
+        'cycle_ms': statistics.mean(cycle_times) * 1000,
+        'cycle_p95_ms': sorted(cycle_times)[max(0, int(len(cycle_times) * 0.95) - 1)] * 1000,
+        'calls_per_cycle': steady_calls / steady_cycles,
+        'calls_per_session_cycle': steady_calls / steady_cycles / sessions,
+        'throttled': server.throttled,
+        'retries': writer.stats['retries'],
+        'dropped': writer.stats['dropped'],
+        'memory_kb_per_session': memory / 1024 / sessions,
+        'calls': dict(server.calls)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline scrape and Sheets benchmark')
+    parser.add_argument('--sessions', default='1,10,100', help='comma separated session counts')
+    parser.add_argument('--cycles', type=int, default=5,
+                        help='scrape cycles per session; the first one only warms up')
+    parser.add_argument('--mode', choices=['capture', 'log'], default='capture',
+                        help='replay through the in-tab capture or the performance log')
+    parser.add_argument('--noise', type=int, default=50,
+                        help='copies of unrelated page traffic in the performance log')
+    parser.add_argument('--change-ratio', type=float, default=0.1,
+                        help='share of products whose counters change each cycle')
+    parser.add_argument('--sessions-per-sheet', type=int, default=10)
+    parser.add_argument('--quota-every', type=int, default=0,
+                        help='answer every Nth write with 429 (0 = never)')
+    parser.add_argument('--writes-per-minute', type=int, default=60000,
+                        help='write queue rate limit used for the run')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+    if args.cycles < 2:
+        parser.error('--cycles must be at least 2')
+
+    random.seed(0)
+    # The replayed log stands in for Chrome's, which is only recorded with the fallback on
+    config.PERFORMANCE_LOG_FALLBACK = args.mode == 'log'
+    product_list = load_fixture('product_list.json')
+    performance_log = load_fixture('performance_log.json')
+
+    results = [
+        run_scale(int(count), args, product_list, performance_log)
+        for count in args.sessions.split(',')
+    ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"\n{'='*96}")
+    print(f"Benchmark: mode={args.mode}, cycles={args.cycles}, change ratio={args.change_ratio}, "
+          f"429 every {args.quota_every or '-'} writes")
+    print(f"{'='*96}")
+    print(f"{'sessions':>8} {'products':>8} {'parse ms':>9} {'cycle ms':>9} {'p95 ms':>8} "
+          f"{'calls/cycle':>11} {'calls/sess':>10} {'429s':>5} {'retries':>7} {'KB/sess':>8}")
+    for r in results:
+        print(f"{r['sessions']:>8} {r['products']:>8} {r['parse_ms']:>9.2f} {r['cycle_ms']:>9.2f} "
+              f"{r['cycle_p95_ms']:>8.2f} {r['calls_per_cycle']:>11.1f} {r['calls_per_session_cycle']:>10.2f} "
+              f"{r['throttled']:>5} {r['retries']:>7} {r['memory_kb_per_session']:>8.1f}")
+    print()
+
+
+if __name__ == '__main__':
+    main()
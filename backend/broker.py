@@ -0,0 +1,320 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+import config
+from products import json_default
+
+
+class SessionBroker:
+    """
+    SQLite-backed hand-off between the API process and scrape workers
+    The API records which sessions should run; each worker heartbeats, picks
+    up the sessions assigned to it and reports their status back. Sessions
+    go to the least loaded live worker and move on when their worker stops
+    heartbeating or gives them up
+    """
+
+    def __init__(self, path=None, heartbeat_timeout=None, max_moves=None):
+        self.path = path or config.BROKER_DB_PATH
+        self.heartbeat_timeout = heartbeat_timeout or config.WORKER_HEARTBEAT_TIMEOUT
+        self.max_moves = max_moves or config.WORKER_SESSION_MAX_MOVES
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False,
+                                    isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS workers (
+                worker_id TEXT PRIMARY KEY,
+                host TEXT,
+                pid INTEGER,
+                capacity INTEGER NOT NULL,
+                heartbeat REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                sheet_url TEXT NOT NULL,
+                state TEXT NOT NULL,
+                worker_id TEXT,
+                excluded TEXT,
+                moves INTEGER NOT NULL DEFAULT 0,
+                status TEXT,
+                products TEXT,
+                products_updated REAL,
+                updated REAL
+            );
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                finished REAL,
+                updated REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS leases (
+                name TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires REAL NOT NULL
+            );
+        ''')
+
+    def _transaction(self, fn):
+        """Run fn(conn) inside one write transaction across processes"""
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = fn(self.conn)
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.conn.execute('COMMIT')
+            return result
+
+    def _live_workers(self, conn):
+        cutoff = time.time() - self.heartbeat_timeout
+        return conn.execute('''
+            SELECT w.worker_id, w.capacity,
+                   (SELECT COUNT(*) FROM sessions s
+                    WHERE s.worker_id = w.worker_id AND s.state = 'running') AS load
+            FROM workers w WHERE w.heartbeat >= ?
+        ''', (cutoff,)).fetchall()
+
+    def _pick_worker(self, conn, exclude=None):
+        """Least loaded live worker relative to its capacity, or None"""
+        candidates = [w for w in self._live_workers(conn)
+                      if w['worker_id'] != exclude and w['load'] < w['capacity']]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda w: w['load'] / w['capacity'])['worker_id']
+
+    # API side
+
+    def submit(self, session_id, sheet_url):
+        """Queue a session to run; raises ValueError if it is already running"""
+        def submit(conn):
+            row = conn.execute('SELECT state FROM sessions WHERE session_id = ?',
+                               (session_id,)).fetchone()
+            if row is not None and row['state'] == 'running':
+                raise ValueError('Already tracking this session')
+            worker_id = self._pick_worker(conn)
+            conn.execute('''
+                INSERT OR REPLACE INTO sessions
+                    (session_id, sheet_url, state, worker_id, excluded, moves, status, products,
+                     products_updated, updated)
+                VALUES (?, ?, 'running', ?, NULL, 0, NULL, NULL, NULL, ?)
+            ''', (session_id, sheet_url, worker_id, time.time()))
+            return worker_id
+        return self._transaction(submit)
+
+    def cancel(self, session_id):
+        """Ask the owning worker to stop a session; raises KeyError if it is not running"""
+        def cancel(conn):
+            updated = conn.execute('''
+                UPDATE sessions SET state = 'stopped', worker_id = NULL, updated = ?
+                WHERE session_id = ? AND state = 'running'
+            ''', (time.time(), session_id)).rowcount
+            if not updated:
+                raise KeyError(session_id)
+        self._transaction(cancel)
+
+    def is_running(self, session_id):
+        with self.lock:
+            row = self.conn.execute('SELECT state FROM sessions WHERE session_id = ?',
+                                    (session_id,)).fetchone()
+        return row is not None and row['state'] == 'running'
+
+    def session(self, session_id):
+        """Stored state of a session as a dict, or None"""
+        with self.lock:
+            row = self.conn.execute('SELECT * FROM sessions WHERE session_id = ?',
+                                    (session_id,)).fetchone()
+        if row is None:
+            return None
+        session = dict(row)
+        session['status'] = json.loads(session['status']) if session['status'] else {}
+        session['products'] = json.loads(session['products']) if session['products'] else None
+        return session
+
+    def products_since(self, session_ids, since):
+        """
+        {session_id: (updated, products)} for sessions reported after since
+        session_ids=None covers every running session
+        """
+        if session_ids is None:
+            with self.lock:
+                rows = self.conn.execute('''
+                    SELECT session_id, products_updated, products FROM sessions
+                    WHERE state = 'running' AND products_updated > ?
+                ''', (since,)).fetchall()
+            return {row['session_id']: (row['products_updated'], json.loads(row['products'])) for row in rows}
+        if not session_ids:
+            return {}
+        placeholders = ', '.join('?' * len(session_ids))
+        with self.lock:
+            rows = self.conn.execute(f'''
+                SELECT session_id, products_updated, products FROM sessions
+                WHERE session_id IN ({placeholders}) AND products_updated > ?
+            ''', list(session_ids) + [since]).fetchall()
+        return {row['session_id']: (row['products_updated'], json.loads(row['products'])) for row in rows}
+
+    def workers(self):
+        """Every known worker with its load and liveness"""
+        cutoff = time.time() - self.heartbeat_timeout
+        with self.lock:
+            rows = self.conn.execute('''
+                SELECT w.*, (SELECT COUNT(*) FROM sessions s
+                             WHERE s.worker_id = w.worker_id AND s.state = 'running') AS load
+                FROM workers w ORDER BY w.worker_id
+            ''').fetchall()
+        return [dict(row, alive=row['heartbeat'] >= cutoff) for row in rows]
+
+    def save_job(self, job, ttl):
+        """Store a bulk start job so every API process can report it; drops jobs finished over ttl ago"""
+        def save_job(conn):
+            now = time.time()
+            conn.execute('DELETE FROM jobs WHERE finished IS NOT NULL AND finished < ?', (now - ttl,))
+            conn.execute('''
+                INSERT OR REPLACE INTO jobs (job_id, data, finished, updated) VALUES (?, ?, ?, ?)
+            ''', (job['jobId'], json.dumps(job), job['finishedAt'], now))
+        self._transaction(save_job)
+
+    def job(self, job_id):
+        """A stored bulk start job as a dict, or None"""
+        with self.lock:
+            row = self.conn.execute('SELECT data FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def claim_lease(self, name, owner, ttl):
+        """
+        Take or renew the named lease for ttl seconds; returns True if owner
+        holds it, False while another owner's lease is still valid
+        """
+        def claim_lease(conn):
+            now = time.time()
+            row = conn.execute('SELECT owner, expires FROM leases WHERE name = ?',
+                               (name,)).fetchone()
+            if row is not None and row['owner'] != owner and row['expires'] > now:
+                return False
+            conn.execute('INSERT OR REPLACE INTO leases (name, owner, expires) VALUES (?, ?, ?)',
+                         (name, owner, now + ttl))
+            return True
+        return self._transaction(claim_lease)
+
+    def release_lease(self, name, owner):
+        """Give up a lease so another process can take it over right away"""
+        def release_lease(conn):
+            conn.execute('DELETE FROM leases WHERE name = ? AND owner = ?', (name, owner))
+        self._transaction(release_lease)
+
+    # Worker side
+
+    def heartbeat(self, worker_id, capacity):
+        """
+        Mark a worker alive, hand out unassigned sessions and take sessions
+        away from workers that stopped heartbeating
+        Returns the sessions now assigned to worker_id as {session_id: sheet_url}
+        """
+        def heartbeat(conn):
+            conn.execute('''
+                INSERT INTO workers (worker_id, host, pid, capacity, heartbeat)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(worker_id) DO UPDATE SET capacity = excluded.capacity,
+                                                     heartbeat = excluded.heartbeat
+            ''', (worker_id, socket.gethostname(), os.getpid(), capacity, time.time()))
+
+            live = {w['worker_id'] for w in self._live_workers(conn)}
+            orphans = conn.execute('''
+                SELECT session_id, worker_id, excluded FROM sessions
+                WHERE state = 'running' AND (worker_id IS NULL OR worker_id NOT IN (%s))
+                ORDER BY updated
+            ''' % ', '.join('?' * len(live)), list(live)).fetchall()
+            for orphan in orphans:
+                target = self._pick_worker(conn, exclude=orphan['excluded'])
+                if target is None:
+                    target = self._pick_worker(conn)
+                if target is None:
+                    break
+                moved = orphan['worker_id'] is not None
+                if moved:
+                    print(f"Moving session {orphan['session_id']} from dead worker "
+                          f"{orphan['worker_id']} to {target}")
+                conn.execute('''
+                    UPDATE sessions SET worker_id = ?, moves = moves + ?, updated = ?
+                    WHERE session_id = ?
+                ''', (target, int(moved), time.time(), orphan['session_id']))
+
+            rows = conn.execute('''
+                SELECT session_id, sheet_url FROM sessions
+                WHERE state = 'running' AND worker_id = ?
+            ''', (worker_id,)).fetchall()
+            return {row['session_id']: row['sheet_url'] for row in rows}
+        return self._transaction(heartbeat)
+
+    def report(self, worker_id, session_id, status, products=None):
+        """Store a session's status (and latest products) reported by its worker"""
+        def report(conn):
+            now = time.time()
+            params = [json.dumps(status), now]
+            products_sql = ''
+            if products is not None:
+                products_sql = ', products = ?, products_updated = ?'
+                params[1:1] = [json.dumps(products, default=json_default), now]
+            conn.execute(f'''
+                UPDATE sessions SET status = ?{products_sql}, updated = ?
+                WHERE session_id = ? AND worker_id = ?
+            ''', params + [session_id, worker_id])
+        self._transaction(report)
+
+    def finish(self, worker_id, session_id, status):
+        """Mark a session whose stream ended as finished"""
+        def finish(conn):
+            conn.execute('''
+                UPDATE sessions SET state = 'finished', worker_id = NULL, status = ?, updated = ?
+                WHERE session_id = ? AND worker_id = ?
+            ''', (json.dumps(status), time.time(), session_id, worker_id))
+        self._transaction(finish)
+
+    def release(self, worker_id, session_id, error):
+        """
+        Give up a failing session so another worker can take it over
+        After max_moves hand-offs it is marked failed instead of moving again
+        """
+        def release(conn):
+            conn.execute('''
+                UPDATE sessions SET worker_id = NULL, excluded = ?, moves = moves + 1,
+                                    state = CASE WHEN moves + 1 >= ? THEN 'failed' ELSE state END,
+                                    status = ?, updated = ?
+                WHERE session_id = ? AND worker_id = ? AND state = 'running'
+            ''', (worker_id, self.max_moves, json.dumps({'lastError': error}), time.time(),
+                  session_id, worker_id))
+            row = conn.execute('SELECT state, moves FROM sessions WHERE session_id = ?',
+                               (session_id,)).fetchone()
+            if row is not None and row['state'] == 'failed':
+                print(f"Session {session_id} failed after {row['moves']} hand-offs: {error}")
+        self._transaction(release)
+
+    def unregister(self, worker_id):
+        """Remove a worker on clean shutdown so its sessions move right away"""
+        def unregister(conn):
+            conn.execute('DELETE FROM workers WHERE worker_id = ?', (worker_id,))
+            conn.execute('''
+                UPDATE sessions SET worker_id = NULL, updated = ?
+                WHERE worker_id = ? AND state = 'running'
+            ''', (time.time(), worker_id))
+        self._transaction(unregister)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Process-wide session broker, created on first use"""
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = SessionBroker()
+        return _broker
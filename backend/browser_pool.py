@@ -0,0 +1,343 @@
+import threading
+import time
+from contextlib import contextmanager
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chrome.options import Options
+from webdriver_manager.chrome import ChromeDriverManager
+
+import config
+import metrics
+
+try:
+    import psutil
+except ImportError:  # Memory-based recycling is skipped without psutil
+    psutil = None
+
+
+class PooledBrowser:
+    """A warm Chrome instance shared by several sessions, one tab each"""
+
+    def __init__(self, browser_id, driver_path=None):
+        self.browser_id = browser_id
+        self.driver_path = driver_path
+        self.lock = threading.RLock()
+        self.driver = None
+        self.tabs = {}
+        self.leases = 0
+        self.scrape_count = 0
+        self.restarts = 0
+        self.started_at = None
+        self.baseline_rss = 0
+
+    def start(self, driver_path=None):
+        """Launch Chrome for the first time"""
+        with self.lock:
+            if driver_path:
+                self.driver_path = driver_path
+            self._start()
+
+    def _start(self):
+        """Launch Chrome with the configured options"""
+        chrome_options = Options()
+        for argument in config.CHROME_OPTIONS:
+            chrome_options.add_argument(argument)
+        if config.PERFORMANCE_LOG_FALLBACK:
+            # ChromeDriver buffers every network event of every tab while this is on
+            chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
+        service = Service(self.driver_path)
+        self.driver = webdriver.Chrome(service=service, options=chrome_options)
+        self.tabs = {}
+        self.scrape_count = 0
+        self.started_at = time.time()
+        self.baseline_rss = self.rss()
+
+    def restart(self):
+        """Quit and relaunch Chrome; tabs are reopened lazily on next use"""
+        with self.lock:
+            self.quit()
+            self._start()
+            self.restarts += 1
+
+    def quit(self):
+        """Quit the WebDriver"""
+        if self.driver:
+            try:
+                self.driver.quit()
+            except Exception as e:
+                print(f"Error quitting browser {self.browser_id}: {str(e)}")
+            self.driver = None
+            self.tabs = {}
+
+    def kill(self):
+        """Kill chromedriver and every Chrome process under it, for when quit() hangs"""
+        process = getattr(getattr(self.driver, 'service', None), 'process', None)
+        if process is None:
+            return
+        try:
+            if psutil is not None:
+                for child in psutil.Process(process.pid).children(recursive=True):
+                    try:
+                        child.kill()
+                    except psutil.Error:
+                        continue
+            process.kill()
+        except Exception as e:
+            print(f"Error killing browser {self.browser_id}: {str(e)}")
+
+    def tab_for(self, session_id):
+        """Switch to the tab owned by session_id, opening it if needed"""
+        handle = self.tabs.get(session_id)
+        if handle not in self.driver.window_handles:
+            if not self.tabs and len(self.driver.window_handles) == 1:
+                # Reuse the blank tab Chrome starts with
+                handle = self.driver.window_handles[0]
+            else:
+                self.driver.switch_to.new_window('tab')
+                handle = self.driver.current_window_handle
+            self.tabs[session_id] = handle
+        if self.driver.current_window_handle != handle:
+            self.driver.switch_to.window(handle)
+        return handle
+
+    def close_tab(self, session_id):
+        """Close the tab owned by session_id, keeping at least one tab open"""
+        handle = self.tabs.pop(session_id, None)
+        if not self.driver or handle not in self.driver.window_handles:
+            return
+        try:
+            if len(self.driver.window_handles) > 1:
+                self.driver.switch_to.window(handle)
+                self.driver.close()
+                self.driver.switch_to.window(self.driver.window_handles[0])
+            else:
+                self.driver.get('about:blank')
+        except Exception as e:
+            print(f"Error closing tab for session {session_id}: {str(e)}")
+
+    def is_alive(self):
+        """Check that chromedriver still answers"""
+        try:
+            self.driver.current_window_handle
+            return True
+        except Exception:
+            return False
+
+    def rss(self):
+        """Resident memory of chromedriver and its Chrome processes, in bytes"""
+        if psutil is None or not self.driver:
+            return 0
+        try:
+            process = psutil.Process(self.driver.service.process.pid)
+            total = process.memory_info().rss
+            for child in process.children(recursive=True):
+                try:
+                    total += child.memory_info().rss
+                except psutil.Error:
+                    continue
+            return total
+        except Exception:
+            return 0
+
+    def needs_recycle(self):
+        """Decide whether the browser should be restarted"""
+        if config.BROWSER_MAX_SCRAPES and self.scrape_count >= config.BROWSER_MAX_SCRAPES:
+            return True
+        if config.BROWSER_MAX_RSS_GROWTH_MB and self.baseline_rss:
+            growth = self.rss() - self.baseline_rss
+            if growth > config.BROWSER_MAX_RSS_GROWTH_MB * 1024 * 1024:
+                return True
+        return False
+
+    def stats(self):
+        """Stats for this browser"""
+        return {
+            'id': self.browser_id,
+            'sessions': list(self.tabs.keys()),
+            'leases': self.leases,
+            'scrapes': self.scrape_count,
+            'restarts': self.restarts,
+            'uptime': round(time.time() - self.started_at, 1) if self.started_at else 0,
+            'rssMb': round(self.rss() / (1024 * 1024), 1)
+        }
+
+
+class BrowserLease:
+    """A session's claim on a tab inside a pooled browser"""
+
+    def __init__(self, pool, browser, session_id):
+        self.pool = pool
+        self.browser = browser
+        self.session_id = session_id
+
+    @contextmanager
+    def use(self):
+        """
+        Lock the browser, switch to this session's tab and yield the driver
+        The browser is health-checked before and recycled after use
+        """
+        browser = self.browser
+        with browser.lock:
+            if not browser.is_alive():
+                print(f"Browser {browser.browser_id} is not responding, restarting")
+                browser.restart()
+            browser.tab_for(self.session_id)
+            try:
+                yield browser.driver
+            finally:
+                browser.scrape_count += 1
+                self.pool.scrapes_total += 1
+                if browser.needs_recycle():
+                    print(f"Recycling browser {browser.browser_id} "
+                          f"after {browser.scrape_count} scrapes")
+                    browser.restart()
+
+    def reset(self):
+        """
+        Recover from a crashed or broken tab: restart the browser if
+        chromedriver stopped answering, otherwise close this session's tab
+        so the next use() opens a fresh one
+        """
+        browser = self.browser
+        with browser.lock:
+            if not browser.is_alive():
+                print(f"Browser {browser.browser_id} is not responding, restarting")
+                browser.restart()
+            else:
+                browser.close_tab(self.session_id)
+
+
+class BrowserPool:
+    """Bounded pool of warm Chrome instances handing out one tab per session"""
+
+    def __init__(self, max_browsers=None, tabs_per_browser=None):
+        self.max_browsers = max_browsers or config.BROWSER_POOL_SIZE
+        self.tabs_per_browser = tabs_per_browser or config.BROWSER_TABS_PER_BROWSER
+        self.browsers = []
+        self.lock = threading.Lock()
+        self.scrapes_total = 0
+        self._driver_path = None
+        self._next_id = 1
+
+    def _get_driver_path(self):
+        """Resolve the ChromeDriver binary once per process"""
+        if self._driver_path is None:
+            self._driver_path = ChromeDriverManager().install()
+        return self._driver_path
+
+    def acquire(self, session_id):
+        """
+        Hand out a tab on the least loaded browser, launching one if allowed
+        A new browser's slot is reserved under the pool lock and Chrome is
+        started outside it, so other acquires and stats() don't wait for the
+        launch; leases landing on a browser that is still starting wait in use()
+        """
+        launch = None
+        with self.lock:
+            candidates = [b for b in self.browsers if b.leases < self.tabs_per_browser]
+            if candidates and (len(self.browsers) >= self.max_browsers
+                               or min(b.leases for b in candidates) == 0):
+                browser = min(candidates, key=lambda b: b.leases)
+            elif len(self.browsers) < self.max_browsers:
+                browser = launch = PooledBrowser(self._next_id)
+                self._next_id += 1
+                self.browsers.append(browser)
+                # Held until Chrome is up, so use() on this browser waits for it
+                browser.lock.acquire()
+            else:
+                # Every browser is full; oversubscribe the least loaded one
+                browser = min(self.browsers, key=lambda b: b.leases)
+            browser.leases += 1
+
+        if launch is not None:
+            try:
+                launch.start(self._get_driver_path())
+            except Exception:
+                with self.lock:
+                    launch.leases = max(0, launch.leases - 1)
+                    if launch.leases == 0 and launch in self.browsers:
+                        self.browsers.remove(launch)
+                raise
+            finally:
+                launch.lock.release()
+        return BrowserLease(self, browser, session_id)
+
+    def release(self, lease):
+        """Close the lease's tab and give its slot back to the pool"""
+        browser = lease.browser
+        with browser.lock:
+            browser.close_tab(lease.session_id)
+        with self.lock:
+            browser.leases = max(0, browser.leases - 1)
+
+    def stats(self):
+        """Pool-wide stats"""
+        with self.lock:
+            browsers = list(self.browsers)
+        browser_stats = [b.stats() for b in browsers]
+        return {
+            'browsers': len(browsers),
+            'maxBrowsers': self.max_browsers,
+            'tabsPerBrowser': self.tabs_per_browser,
+            'leases': sum(b.leases for b in browsers),
+            'scrapes': self.scrapes_total,
+            'rssMb': round(sum(s['rssMb'] for s in browser_stats), 1),
+            'details': browser_stats
+        }
+
+    def collect_metrics(self):
+        """Pool gauges for /metrics"""
+        stats = self.stats()
+        yield ('letu_browser_pool_browsers', 'Chrome instances in the pool', 'gauge',
+               [({}, stats['browsers'])])
+        yield ('letu_browser_pool_leases', 'Sessions holding a tab', 'gauge',
+               [({}, stats['leases'])])
+        yield ('letu_browser_pool_rss_bytes', 'Resident memory per pooled browser', 'gauge',
+               [({'browser': d['id']}, int(d['rssMb'] * 1024 * 1024)) for d in stats['details']])
+        yield ('letu_browser_pool_restarts', 'Restarts per pooled browser', 'gauge',
+               [({'browser': d['id']}, d['restarts']) for d in stats['details']])
+
+    def shutdown(self, timeout=None):
+        """
+        Quit every browser in the pool, in parallel
+        Browsers still busy or not quit after timeout seconds are killed
+        """
+        with self.lock:
+            browsers = list(self.browsers)
+            self.browsers = []
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        def quit_browser(browser):
+            # A scrape may still hold the lock; quitting makes it fail fast
+            locked = browser.lock.acquire(timeout=1)
+            try:
+                browser.quit()
+            finally:
+                if locked:
+                    browser.lock.release()
+
+        threads = []
+        for browser in browsers:
+            thread = threading.Thread(target=quit_browser, args=(browser,), daemon=True)
+            thread.start()
+            threads.append((browser, thread))
+        for browser, thread in threads:
+            thread.join(None if deadline is None else max(0, deadline - time.monotonic()))
+            if thread.is_alive():
+                print(f"Browser {browser.browser_id} did not quit in time, killing it")
+                browser.kill()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Process-wide browser pool, created on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+            metrics.REGISTRY.add_collector(_pool.collect_metrics)
+        return _pool
@@ -0,0 +1,205 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from sheets_handler import extract_spreadsheet_id
+
+
+class BulkStarter:
+    """
+    Starts many sessions from one request
+    Entries are validated up front and the request returns a job id right
+    away; sessions are then started in the background, at most concurrency
+    at a time, so a full day's schedule doesn't open every Chrome tab and
+    Sheets client at once. Per-session progress is kept per job.
+
+    Session states: queued -> starting -> tracking -> live (first scrape
+    written), or rejected (failed validation), failed or cancelled
+
+    With a broker (worker mode, several API processes) every change to a
+    job is also stored there, so any process can answer for it
+    """
+
+    def __init__(self, tracker, concurrency=None, max_sessions=None, ttl=None, broker=None):
+        self.tracker = tracker
+        self.broker = broker
+        self.max_sessions = max_sessions or config.BULK_START_MAX_SESSIONS
+        self.ttl = config.BULK_JOB_TTL if ttl is None else ttl
+        self.executor = ThreadPoolExecutor(
+            max_workers=concurrency or config.BULK_START_CONCURRENCY,
+            thread_name_prefix='bulk-start'
+        )
+        self.lock = threading.Lock()
+        # job_id -> {'jobId', 'createdAt', 'finishedAt', 'sessions': [entry, ...]}
+        self.jobs = {}
+        self.closed = False
+
+    def submit(self, sessions, default_sheet_url=None):
+        """
+        Validate the entries and queue the valid ones
+        Raises ValueError if the request as a whole is unusable; invalid
+        entries are kept in the job as 'rejected' with their reason
+        """
+        if not isinstance(sessions, list) or not sessions:
+            raise ValueError('Missing sessions list')
+        if len(sessions) > self.max_sessions:
+            raise ValueError(f'At most {self.max_sessions} sessions per request')
+        if self.closed:
+            raise ValueError('Server is shutting down')
+
+        entries = []
+        seen = set()
+        for item in sessions:
+            if not isinstance(item, dict):
+                item = {'sessionId': item}
+            session_id = str(item.get('sessionId') or '').strip()
+            sheet_url = item.get('sheetUrl') or default_sheet_url
+            error = self._validate(session_id, sheet_url, seen)
+            entries.append({
+                'sessionId': session_id,
+                'sheetUrl': sheet_url,
+                'state': 'rejected' if error else 'queued',
+                'error': error,
+                'startedAt': None,
+                'finishedAt': None
+            })
+            seen.add(session_id)
+
+        job_id = uuid.uuid4().hex[:12]
+        job = {
+            'jobId': job_id,
+            'createdAt': time.time(),
+            'finishedAt': None,
+            'sessions': entries
+        }
+        queued = [entry for entry in entries if entry['state'] == 'queued']
+        if not queued:
+            job['finishedAt'] = time.time()
+        with self.lock:
+            self._prune()
+            self.jobs[job_id] = job
+        self._save(job)
+        for entry in queued:
+            self.executor.submit(self._start, job, entry)
+        print(f"Bulk start {job_id}: {len(queued)} queued, {len(entries) - len(queued)} rejected")
+        return self.job(job_id)
+
+    def _validate(self, session_id, sheet_url, seen):
+        """Reason the entry can't be started, or None"""
+        if not session_id:
+            return 'Missing sessionId'
+        if session_id in seen:
+            return 'Duplicate sessionId in request'
+        if not sheet_url:
+            return 'Missing sheetUrl'
+        try:
+            extract_spreadsheet_id(sheet_url)
+        except ValueError as e:
+            return str(e)
+        if self.tracker.is_tracking(session_id):
+            return 'Already tracking this session'
+        return None
+
+    def _start(self, job, entry):
+        if self.closed:
+            self._settle(job, entry, 'cancelled', 'Server is shutting down')
+            return
+        with self.lock:
+            entry['state'] = 'starting'
+            entry['startedAt'] = time.time()
+        self._save(job)
+        try:
+            self.tracker.start(entry['sessionId'], entry['sheetUrl'])
+        except Exception as e:
+            print(f"Bulk start {job['jobId']}: session {entry['sessionId']} failed: {str(e)}")
+            self._settle(job, entry, 'failed', str(e))
+            return
+        self._settle(job, entry, 'tracking', None)
+
+    def _settle(self, job, entry, state, error):
+        with self.lock:
+            entry['state'] = state
+            entry['error'] = error
+            entry['finishedAt'] = time.time()
+            if all(item['finishedAt'] for item in job['sessions'] if item['state'] != 'rejected'):
+                job['finishedAt'] = time.time()
+        self._save(job)
+
+    def _save(self, job):
+        """Store a snapshot of the job in the broker, if there is one"""
+        if self.broker is None:
+            return
+        with self.lock:
+            snapshot = dict(job, sessions=[dict(entry) for entry in job['sessions']])
+        try:
+            self.broker.save_job(snapshot, self.ttl)
+        except Exception as e:
+            print(f"Error saving bulk start {job['jobId']}: {str(e)}")
+
+    def job(self, job_id):
+        """Progress of a job, or None if unknown or expired"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is not None:
+                job = dict(job, sessions=[dict(entry) for entry in job['sessions']])
+        if job is None and self.broker is not None:
+            # Submitted to another API process
+            job = self.broker.job(job_id)
+        if job is None:
+            return None
+        sessions = job['sessions']
+        result = {key: value for key, value in job.items() if key != 'sessions'}
+
+        counts = {}
+        for entry in sessions:
+            if entry['state'] == 'tracking':
+                # Running sessions report how far they got since starting
+                status = self.tracker.status(entry['sessionId'])
+                entry['lastUpdate'] = status.get('lastUpdate')
+                entry['productCount'] = status.get('productCount', 0)
+                entry['failures'] = status.get('failures', 0)
+                if not status.get('tracking'):
+                    if status.get('finished'):
+                        entry['state'] = 'finished'
+                    elif status.get('failed'):
+                        entry['state'] = 'failed'
+                        entry['error'] = status.get('lastError')
+                    else:
+                        entry['state'] = 'stopped'
+                elif entry['lastUpdate']:
+                    entry['state'] = 'live'
+            counts[entry['state']] = counts.get(entry['state'], 0) + 1
+
+        result['done'] = result['finishedAt'] is not None
+        result['counts'] = counts
+        result['sessions'] = sessions
+        return result
+
+    def _prune(self):
+        """Drop finished jobs older than the TTL; caller holds the lock"""
+        cutoff = time.time() - self.ttl
+        for job_id in [job_id for job_id, job in self.jobs.items()
+                       if job['finishedAt'] and job['finishedAt'] < cutoff]:
+            del self.jobs[job_id]
+
+    def shutdown(self):
+        """Cancel sessions that haven't started yet; in-flight starts finish on their own"""
+        self.closed = True
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        cancelled = []
+        with self.lock:
+            for job in self.jobs.values():
+                for entry in job['sessions']:
+                    if entry['state'] == 'queued':
+                        entry['state'] = 'cancelled'
+                        entry['error'] = 'Server is shutting down'
+                        entry['finishedAt'] = time.time()
+                        if job not in cancelled:
+                            cancelled.append(job)
+                if job in cancelled and all(item['finishedAt'] for item in job['sessions']
+                                            if item['state'] != 'rejected'):
+                    job['finishedAt'] = time.time()
+        for job in cancelled:
+            self._save(job)
@@ -0,0 +1,142 @@
+from datetime import datetime
+
+import config
+from products import as_record
+
+
+class Delta:
+    """
+    What changed in one session between two scrapes
+    added: records not seen before; changed: (record, {field: (old, new)})
+    pairs; removed: keys of products no longer listed. products is the full
+    scrape, for sinks that need totals. A delta is falsy when nothing changed.
+    sequence numbers a detector's non-empty deltas 1, 2, ..., so a consumer
+    can tell when it missed one
+    """
+
+    __slots__ = ('session_id', 'sequence', 'timestamp', 'products', 'added', 'changed', 'removed')
+
+    def __init__(self, session_id, products, added=(), changed=(), removed=(), sequence=0):
+        self.session_id = session_id
+        self.sequence = sequence
+        self.timestamp = datetime.now().isoformat(timespec='seconds')
+        self.products = products
+        self.added = list(added)
+        self.changed = list(changed)
+        self.removed = list(removed)
+
+    def __bool__(self):
+        return bool(self.added or self.changed or self.removed)
+
+    def __len__(self):
+        """Number of products added or changed"""
+        return len(self.added) + len(self.changed)
+
+    @property
+    def touched(self):
+        """Records that were added or changed"""
+        return self.added + [record for record, _ in self.changed]
+
+    def merge(self, newer):
+        """
+        This delta followed by newer, as one delta, for consumers that fell
+        behind; field diffs run from this delta's old values to newer's
+        """
+        added = {record.key: record for record in self.added}
+        changed = {record.key: (record, fields) for record, fields in self.changed}
+        removed = dict.fromkeys(self.removed)
+        for record in newer.added:
+            removed.pop(record.key, None)
+            changed.pop(record.key, None)
+            added[record.key] = record
+        for record, fields in newer.changed:
+            key = record.key
+            if key in added:
+                added[key] = record
+                continue
+            merged = dict(changed[key][1]) if key in changed else {}
+            for field, (old, new) in fields.items():
+                merged[field] = (merged[field][0] if field in merged else old, new)
+            merged = {field: (old, new) for field, (old, new) in merged.items() if old != new}
+            if merged:
+                changed[key] = (record, merged)
+            else:
+                changed.pop(key, None)
+        for key in newer.removed:
+            changed.pop(key, None)
+            if added.pop(key, None) is None:
+                removed[key] = None
+        delta = Delta(newer.session_id, newer.products, added.values(), changed.values(),
+                      removed, newer.sequence)
+        delta.timestamp = newer.timestamp
+        return delta
+
+    def to_event(self):
+        """JSON-ready form for live viewers"""
+        return {
+            'sessionId': self.session_id,
+            'timestamp': self.timestamp,
+            'count': len(self.products),
+            'products': self.products,
+            'added': [record.key for record in self.added],
+            'removed': self.removed,
+            'changes': [
+                {'itemId': record.key,
+                 'fields': {field: {'old': old, 'new': new} for field, (old, new) in fields.items()}}
+                for record, fields in self.changed
+            ]
+        }
+
+
+class ChangeDetector:
+    """
+    Per-session fingerprints of the last scrape, one values() tuple per
+    product key; detect() turns each new scrape into a Delta with
+    field-level diffs for the products that moved
+    """
+
+    def __init__(self, session_id=None):
+        self.session_id = session_id
+        # product key -> values() tuple
+        self.fingerprints = {}
+        # Non-empty deltas returned so far
+        self.sequence = 0
+
+    def detect(self, products):
+        """
+        Delta against the previous scrape
+        An empty scrape is treated as missing data, not as every product
+        being removed, and leaves the fingerprints untouched
+        """
+        if not products:
+            return Delta(self.session_id, products or [])
+
+        records = [as_record(product) for product in products]
+        previous = self.fingerprints
+        current = {}
+        added = []
+        changed = []
+        for record in records:
+            key = record.key
+            values = record.values()
+            current[key] = values
+            old = previous.get(key)
+            if old is None:
+                added.append(record)
+            elif old != values:
+                changed.append((record, {
+                    field: (before, after)
+                    for field, before, after in zip(config.PRODUCT_FIELDS, old, values)
+                    if before != after
+                }))
+        removed = [key for key in previous if key not in current]
+        self.fingerprints = current
+        delta = Delta(self.session_id, records, added, changed, removed)
+        if delta:
+            self.sequence += 1
+            delta.sequence = self.sequence
+        return delta
+
+    def reset(self):
+        """Treat every product as new on the next scrape"""
+        self.fingerprints = {}
@@ -5,13 +5,58 @@ Modify these values to customize behavior
 
 # Scraping Configuration
 SCRAPE_INTERVAL = 30  # seconds between each scrape
+ADAPTIVE_INTERVAL = True  # Adjust the interval to how fast the data changes
+SCRAPE_INTERVAL_MIN = max(1, SCRAPE_INTERVAL // 6)  # floor while counters change quickly
+SCRAPE_INTERVAL_MAX = SCRAPE_INTERVAL * 4  # ceiling while nothing changes
+ADAPTIVE_FAST_CHANGE_RATIO = 0.2  # share of changed products that halves the interval
+STREAM_END_IDLE_SECONDS = 1800  # stop tracking after this long without changes (0 = never)
+SCRAPE_JITTER = 0.1  # +/- fraction of the interval added so sessions don't poll in lockstep
+SCRAPE_START_JITTER = 3  # seconds of random delay before a session's first scrape
 HEADLESS_MODE = True  # Run browser in headless mode (no visible window)
 BROWSER_TIMEOUT = 30  # seconds to wait for page load
+READY_POLL_INTERVAL = 0.1  # seconds between readiness checks while a page loads
+READY_DOM_GRACE = 1.0  # seconds to wait for a capture once the product table has rendered
+
+# Scrape mode: 'browser' reloads the dashboard every cycle, 'http' uses the
+# browser once for cookies and then polls the productList API directly
+SCRAPE_MODE = 'http'
+HTTP_TIMEOUT = 10  # seconds to wait for a productList response
+HTTP_POOL_SIZE = 20  # pooled connections shared by all sessions
+
+# productList capture
+PRODUCT_LIST_URL_PATTERN = 'productList'  # URL fragment identifying the product API
+PRODUCT_LIST_PAGE_PARAMS = ['offset', 'page', 'pageNum']  # query params that identify a page
+PERFORMANCE_LOG_FALLBACK = False  # Record Chrome's performance log for documents the capture hook missed
+
+# Browser Pool Configuration
+BROWSER_POOL_SIZE = 2  # Maximum number of Chrome instances kept warm
+BROWSER_TABS_PER_BROWSER = 5  # Sessions sharing one Chrome instance (one tab each)
+BROWSER_MAX_SCRAPES = 500  # Restart a browser after this many scrapes (0 = never)
+BROWSER_MAX_RSS_GROWTH_MB = 1024  # Restart a browser once its memory grows this much (0 = never)
+
+# Session registry: tracked sessions are journaled here and resumed on startup
+SESSION_REGISTRY_PATH = 'sessions.json'
+SESSION_REGISTRY_SAVE_INTERVAL = 5  # seconds; progress updates are batched into one write
+SESSION_RESUME_STAGGER = 2  # seconds between resumed session launches
+
+# Worker mode: the API process only records sessions in a SQLite broker and
+# separate `python worker.py` processes run them
+WORKER_MODE = False
+BROKER_DB_PATH = 'broker.db'
+WORKER_CAPACITY = BROWSER_POOL_SIZE * BROWSER_TABS_PER_BROWSER  # sessions per worker
+WORKER_HEARTBEAT_INTERVAL = 5  # seconds between worker heartbeats
+WORKER_HEARTBEAT_TIMEOUT = 30  # seconds without a heartbeat before sessions move elsewhere
+WORKER_SESSION_MAX_FAILURES = 5  # consecutive failed cycles before a worker gives a session up
+WORKER_SESSION_MAX_MOVES = 5  # hand-offs (failed starts included) before a session is marked failed
+LIVE_FEED_RELAY_INTERVAL = 1  # seconds between broker polls for live viewers in worker mode
 
 # Server Configuration
 FLASK_HOST = '0.0.0.0'  # Listen on all interfaces
 FLASK_PORT = 5000
 FLASK_DEBUG = True  # Enable debug mode for development
+SHUTDOWN_TIMEOUT = 20  # seconds to stop scraping, flush Sheets writes and quit browsers on SIGTERM
+GUNICORN_WORKERS = 4  # API processes under gunicorn in worker mode; always 1 otherwise
+GUNICORN_THREADS = 32  # threads per API process; every open live feed holds one
 
 # Frontend Configuration
 FRONTEND_URL = 'http://localhost:5173'
@@ -19,7 +64,46 @@ FRONTEND_URL = 'http://localhost:5173'
 # Google Sheets Configuration
 CREDENTIALS_FILE = 'credentials.json'
 TOKEN_FILE = 'token.json'
-SHEETS_SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
+SHEETS_SCOPES = ['https://www.googleapis.com/auth/spreadsheets']  # If modifying these scopes, delete token.json
+TOKEN_REFRESH_MARGIN = 300  # seconds before expiry to refresh the access token
+SHEETS_HTTP_TIMEOUT = 30  # seconds
+SHEETS_WRITE_REQUESTS_PER_MINUTE = 60  # Sheets API write quota per user per project
+SHEETS_WRITE_BURST = 10  # writes allowed back to back before throttling
+# Worksheets each tracked session writes to, created on demand; {session_id} is filled in
+SHEET_TABS = {
+    'live': 'Live {session_id}',  # current product table, rows updated in place
+    'history': 'History {session_id}',  # every changed row appended with its timestamp
+    'summary': 'Summary',  # one totals row per session, shared by all sessions
+}
+SHEET_DESTINATIONS = ['live', 'history', 'summary']  # which of SHEET_TABS each scrape fans out to
+
+# Output sinks: every scrape that changed something goes to each of these,
+# each sink on its own thread and queue so a slow one never stalls scraping
+OUTPUT_SINKS = ['sheets']  # any of 'sheets', 'jsonl', 'csv', 'parquet' (parquet needs pyarrow)
+SHEETS_PUSH_INTERVAL = 0  # seconds between Sheets pushes per session (0 = every changed scrape)
+SINK_DIRECTORY = 'exports'  # local files go to exports/<sink>/<session>-<time>.<ext>
+SINK_QUEUE_SIZE = 1000  # deltas waiting per sink before further ones are merged per session
+SINK_BUFFER_ROWS = 500  # rows buffered per session before a file write
+SINK_FLUSH_INTERVAL = 5  # seconds; buffered rows and delayed Sheets pushes go out at least this often
+SINK_ROTATE_BYTES = 64 * 1024 * 1024  # start a new file past this size
+SINK_ROTATE_SECONDS = 3600  # ...or once a file is this old
+
+# Shop-wide aggregation across every tracked session (GET /api/aggregate)
+AGGREGATE_METRICS = ['revenue', 'itemsSold', 'ordersCreated', 'productClicks']  # summed per item, ranked
+AGGREGATE_TOP_N = 10  # leaderboard length
+AGGREGATE_SHEET_URL = ''  # spreadsheet for the shop-wide summary tab ('' = API only)
+AGGREGATE_SHEET_TAB = 'Shop Totals'
+AGGREGATE_WRITE_INTERVAL = 60  # seconds between summary tab rewrites (only when totals changed)
+
+# Preview Configuration
+PREVIEW_CACHE_TTL = 60  # seconds a preview result is reused
+
+# Live Feed Configuration
+LIVE_FEED_QUEUE_SIZE = 10  # pending events per viewer before the oldest is dropped
+LIVE_FEED_HEARTBEAT = 15  # seconds between keep-alive comments on idle streams
+
+# History Configuration
+HISTORY_DB_PATH = 'history.db'  # SQLite file holding per-product metric history
 
 # Shopee URLs
 SHOPEE_DASHBOARD_URL = 'https://svcs-admin.shopee.vn/dashboard/stream'
@@ -43,13 +127,35 @@ PRODUCT_FIELDS = [
     'revenue'
 ]
 
+# DOM fallback: CSS selectors for the product table and the field shown in
+# each column, left to right (None skips a column)
+DOM_SELECTORS = {
+    'row': 'table tbody tr',
+    'cell': 'td',
+    'key_attr': 'data-row-key'  # row attribute holding the item id, if any
+}
+DOM_COLUMNS = ['title', 'productClicks', 'ctr', 'ordersCreated', 'itemsSold', 'revenue']
+
+# Number format used by the dashboard (Vietnamese: 1.234.567,89)
+NUMBER_THOUSANDS_SEPARATOR = '.'
+NUMBER_DECIMAL_SEPARATOR = ','
+
 # Rate Limiting (to avoid overwhelming the target server)
-MAX_CONCURRENT_SESSIONS = 5  # Maximum number of sessions to track simultaneously
+MAX_CONCURRENT_SESSIONS = 5  # Maximum number of scrapes running at the same time
 REQUEST_DELAY = 1  # seconds between requests (if making multiple)
 
+# Bulk start (POST /api/start-tracking/bulk)
+BULK_START_CONCURRENCY = 4  # sessions brought up at the same time (each may start Chrome)
+BULK_START_MAX_SESSIONS = 100  # sessions accepted per request
+BULK_JOB_TTL = 3600  # seconds a finished job's progress stays available
+
 # Retry Configuration
-MAX_RETRIES = 3
-RETRY_DELAY = 5  # seconds
+MAX_RETRIES = 3  # Sheets write retries; also failed cycles in a row before a session's circuit opens
+RETRY_DELAY = 5  # seconds, doubled after each consecutive failure
+MAX_RETRY_DELAY = 300  # seconds, upper bound for the backoff
+CIRCUIT_OPEN_SECONDS = 300  # an open circuit skips the session this long before one trial cycle
+CIRCUIT_MAX_OPEN_SECONDS = 3600  # the pause doubles each time a trial fails, up to this
+LOGIN_URL_MARKERS = ['/login', '/signin', '/authenticate']  # URL fragments of the seller login page
 
 # Chrome Options
 CHROME_OPTIONS = [
@@ -0,0 +1,86 @@
+import re
+
+import config
+from products import ProductRecord, TEXT_FIELDS
+
+# Reads every row of the product table in one round-trip. Returns
+# [{key, cells: [text, ...]}, ...] so Python only has to parse numbers.
+DOM_EXTRACT_SCRIPT = '''
+var selectors = arguments[0];
+var rows = document.querySelectorAll(selectors.row);
+var result = [];
+for (var i = 0; i < rows.length; i++) {
+  var cells = rows[i].querySelectorAll(selectors.cell);
+  if (!cells.length) { continue; }
+  var texts = [];
+  for (var j = 0; j < cells.length; j++) {
+    texts.push((cells[j].innerText || cells[j].textContent || '').trim());
+  }
+  result.push({
+    key: selectors.key_attr ? rows[i].getAttribute(selectors.key_attr) : null,
+    cells: texts
+  });
+}
+return result;
+'''
+
+_NUMBER_RE = re.compile(r'-?[\d.,\s ]*\d')
+
+
+def parse_number(text, thousands=None, decimal=None):
+    """
+    Parse a number formatted for the dashboard locale, e.g. '1.234,5' in
+    Vietnamese. Returns an int for whole numbers, a float otherwise, and 0
+    when there is no number in the text
+    """
+    thousands = config.NUMBER_THOUSANDS_SEPARATOR if thousands is None else thousands
+    decimal = config.NUMBER_DECIMAL_SEPARATOR if decimal is None else decimal
+
+    match = _NUMBER_RE.search(text or '')
+    if not match:
+        return 0
+    number = match.group(0).replace(' ', '').replace(' ', '')
+    if thousands:
+        number = number.replace(thousands, '')
+    number = number.replace(decimal, '.')
+    try:
+        value = float(number)
+    except ValueError:
+        return 0
+    return int(value) if value.is_integer() and '.' not in number else value
+
+
+def parse_percentage(text, thousands=None, decimal=None):
+    """Parse a percentage such as '12,5%' into 12.5"""
+    return float(parse_number(text, thousands, decimal))
+
+
+class DomTableExtractor:
+    """Product rows from the dashboard table, read with a single execute_script"""
+
+    def __init__(self, selectors=None, columns=None):
+        self.selectors = selectors or config.DOM_SELECTORS
+        self.columns = columns or config.DOM_COLUMNS
+
+    def extract(self, driver):
+        """Rows with fewer cells than configured columns (headers, spacers) are skipped"""
+        rows = driver.execute_script(DOM_EXTRACT_SCRIPT, self.selectors) or []
+        products = []
+        for row in rows:
+            cells = row.get('cells') or []
+            if len(cells) < len(self.columns):
+                continue
+            product = {}
+            if row.get('key'):
+                product['itemId'] = parse_number(row['key'])
+            for field, text in zip(self.columns, cells):
+                if field is None:
+                    continue
+                if field == 'ctr':
+                    product[field] = parse_percentage(text)
+                elif field in TEXT_FIELDS:
+                    product[field] = text
+                else:
+                    product[field] = parse_number(text)
+            products.append(ProductRecord.from_dict(product))
+        return products
@@ -0,0 +1,151 @@
+import time
+
+from selenium.common.exceptions import (
+    InvalidSessionIdException,
+    NoSuchWindowException,
+    TimeoutException,
+    WebDriverException
+)
+from urllib3.exceptions import HTTPError as Urllib3Error
+
+import config
+
+# Fragments of WebDriver error messages that mean the driver or tab is gone
+_DRIVER_GONE_MARKERS = (
+    'chrome not reachable',
+    'tab crashed',
+    'disconnected',
+    'session deleted',
+    'no such window',
+    'target window already closed',
+    'session not created',
+    'invalid session id'
+)
+
+
+class ScrapeError(Exception):
+    """A scrape cycle that produced no usable data; kind names the failure for status and metrics"""
+
+    kind = 'scrape'
+
+
+class DriverError(ScrapeError):
+    """chromedriver died or the session's tab crashed or disappeared"""
+
+    kind = 'driver'
+
+
+class LoginRequiredError(ScrapeError):
+    """The dashboard redirected to a login page"""
+
+    kind = 'login'
+
+
+class PageLoadError(ScrapeError):
+    """The dashboard didn't deliver product data within BROWSER_TIMEOUT"""
+
+    kind = 'page_load'
+
+
+def classify(error):
+    """Wrap an exception raised while scraping in the matching ScrapeError"""
+    if isinstance(error, ScrapeError):
+        return error
+    message = str(error)
+    if isinstance(error, (InvalidSessionIdException, NoSuchWindowException)):
+        return DriverError(message)
+    if isinstance(error, TimeoutException):
+        return PageLoadError(message)
+    if isinstance(error, WebDriverException):
+        if any(marker in message.lower() for marker in _DRIVER_GONE_MARKERS):
+            return DriverError(message)
+        return ScrapeError(message)
+    if isinstance(error, (ConnectionError, Urllib3Error)):
+        # chromedriver's HTTP port no longer answers
+        return DriverError(message)
+    return ScrapeError(message)
+
+
+def is_driver_failure(error):
+    return isinstance(classify(error), DriverError)
+
+
+class CircuitBreaker:
+    """
+    Per-session circuit breaker over consecutive failed cycles
+    closed: failures are retried after RETRY_DELAY, doubled each time
+    open: after max_failures in a row the session isn't scraped at all for
+    a cooldown, which doubles each time the circuit reopens
+    half_open: once the cooldown ends a single trial cycle runs; success
+    closes the circuit, failure opens it again
+    """
+
+    def __init__(self, max_failures=None, retry_delay=None, max_retry_delay=None,
+                 cooldown=None, max_cooldown=None):
+        self.max_failures = max_failures or config.MAX_RETRIES
+        self.retry_delay = retry_delay or config.RETRY_DELAY
+        self.max_retry_delay = max_retry_delay or config.MAX_RETRY_DELAY
+        self.cooldown = cooldown or config.CIRCUIT_OPEN_SECONDS
+        self.max_cooldown = max_cooldown or config.CIRCUIT_MAX_OPEN_SECONDS
+        self.state = 'closed'
+        self.failures = 0
+        # Times the circuit opened without a success in between
+        self.trips = 0
+        self.open_until = None
+        self.last_error = None
+        self.last_kind = None
+        self.last_failure_at = None
+        self.recoveries = 0
+
+    def allow(self):
+        """True if a cycle may run now; moves an expired open circuit to half_open"""
+        if self.state == 'open':
+            if time.monotonic() < self.open_until:
+                return False
+            self.state = 'half_open'
+        return True
+
+    def remaining(self):
+        """Seconds until an open circuit lets a trial cycle through"""
+        if self.state != 'open':
+            return 0
+        return max(0, self.open_until - time.monotonic())
+
+    def record_success(self):
+        """Returns True if this success closed an open or half-open circuit"""
+        recovered = self.state != 'closed' or self.failures > 0
+        if recovered:
+            self.recoveries += 1
+        self.state = 'closed'
+        self.failures = 0
+        self.trips = 0
+        self.open_until = None
+        return recovered
+
+    def record_failure(self, error):
+        """Count a failed cycle; returns the delay before the next attempt"""
+        self.failures += 1
+        self.last_error = str(error).strip()
+        self.last_kind = getattr(error, 'kind', ScrapeError.kind)
+        self.last_failure_at = time.time()
+        if self.state == 'half_open' or self.failures >= self.max_failures:
+            self.trips += 1
+            delay = min(self.cooldown * 2 ** (self.trips - 1), self.max_cooldown)
+            self.state = 'open'
+            self.open_until = time.monotonic() + delay
+            return delay
+        return min(self.retry_delay * 2 ** (self.failures - 1), self.max_retry_delay)
+
+    def status(self):
+        """State for /api/status"""
+        status = {
+            'state': self.state,
+            'failures': self.failures,
+            'lastError': self.last_error,
+            'failureKind': self.last_kind,
+            'lastFailureAt': self.last_failure_at,
+            'recoveries': self.recoveries
+        }
+        if self.state == 'open':
+            status['retryAt'] = time.time() + self.remaining()
+        return status
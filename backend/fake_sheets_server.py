@@ -0,0 +1,170 @@
+"""
+Local stand-in for the Google Sheets v4 API
+Counts calls per endpoint and can answer with 429 to simulate quota errors
+Used by benchmark.py; it keeps just enough state for GoogleSheetsHandler
+"""
+
+import json
+import re
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+
+import httplib2
+from googleapiclient.discovery import build
+
+ROUTES = [
+    ('POST', re.compile(r'^/v4/spreadsheets/([^/]+)/values:batchUpdate$'), 'values.batchUpdate'),
+    ('POST', re.compile(r'^/v4/spreadsheets/([^/]+)/values/(.+):clear$'), 'values.clear'),
+    ('POST', re.compile(r'^/v4/spreadsheets/([^/]+)/values/(.+):append$'), 'values.append'),
+    ('GET', re.compile(r'^/v4/spreadsheets/([^/]+)/values/(.+)$'), 'values.get'),
+    ('PUT', re.compile(r'^/v4/spreadsheets/([^/]+)/values/(.+)$'), 'values.update'),
+    ('POST', re.compile(r'^/v4/spreadsheets/([^/:]+):batchUpdate$'), 'batchUpdate'),
+    ('GET', re.compile(r'^/v4/spreadsheets/([^/]+)$'), 'get'),
+]
+
+WRITE_METHODS = {'values.batchUpdate', 'values.clear', 'values.append', 'values.update', 'batchUpdate'}
+
+
+class FakeSheetsServer:
+    """Threaded HTTP server speaking the subset of Sheets v4 the handler uses"""
+
+    def __init__(self, quota_every=0, host='127.0.0.1', port=0):
+        # Every Nth write answers 429 (0 = never)
+        self.quota_every = quota_every
+        self.calls = Counter()
+        self.throttled = 0
+        self.lock = threading.Lock()
+        self.spreadsheets = {}
+        self._writes = 0
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}/'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def total_calls(self):
+        with self.lock:
+            return sum(self.calls.values())
+
+    def build_service(self):
+        """A googleapiclient Sheets service pointed at this server"""
+        return build(
+            'sheets', 'v4',
+            http=httplib2.Http(),
+            client_options={'api_endpoint': self.url},
+            static_discovery=True
+        )
+
+    def _spreadsheet(self, spreadsheet_id):
+        return self.spreadsheets.setdefault(spreadsheet_id, {
+            'headers': False,
+            'sheets': [{'properties': {'sheetId': 0, 'title': 'Sheet1', 'index': 0}}]
+        })
+
+    def _dispatch(self, method, path, body):
+        """Return (status, payload) for a request"""
+        for route_method, pattern, name in ROUTES:
+            if route_method != method:
+                continue
+            match = pattern.match(path)
+            if not match:
+                continue
+
+            with self.lock:
+                self.calls[name] += 1
+                if name in WRITE_METHODS:
+                    self._writes += 1
+                    if self.quota_every and self._writes % self.quota_every == 0:
+                        self.throttled += 1
+                        return 429, {'error': {
+                            'code': 429,
+                            'message': 'Quota exceeded for quota metric Write requests',
+                            'status': 'RESOURCE_EXHAUSTED'
+                        }}
+
+                spreadsheet_id = match.group(1)
+                spreadsheet = self._spreadsheet(spreadsheet_id)
+                return 200, self._respond(name, spreadsheet_id, spreadsheet, match, body)
+
+        return 404, {'error': {'code': 404, 'message': f'No route for {method} {path}'}}
+
+    def _respond(self, name, spreadsheet_id, spreadsheet, match, body):
+        if name == 'values.get':
+            values = [['Item ID']] if spreadsheet['headers'] else []
+            return {'range': match.group(2), 'values': values}
+        if name == 'values.update':
+            if match.group(2).split('!')[-1].startswith('A1'):
+                spreadsheet['headers'] = True
+            return {'spreadsheetId': spreadsheet_id, 'updatedRange': match.group(2)}
+        if name == 'values.append':
+            # Rows go below the header, one after another per range
+            rows = spreadsheet.setdefault('appended', Counter())
+            prefix = match.group(2).split('!')[0]
+            row = rows[prefix] + 2
+            rows[prefix] += len(body.get('values', []))
+            return {'spreadsheetId': spreadsheet_id, 'updates': {'updatedRange': f'{prefix}!A{row}'}}
+        if name == 'values.batchUpdate':
+            data = body.get('data', [])
+            for entry in data:
+                if entry['range'].split('!')[-1].startswith('A1'):
+                    spreadsheet['headers'] = True
+            return {'spreadsheetId': spreadsheet_id, 'totalUpdatedRows': len(data)}
+        if name == 'batchUpdate':
+            replies = []
+            for request in body.get('requests', []):
+                if 'addSheet' in request:
+                    properties = dict(request['addSheet'].get('properties', {}))
+                    properties['sheetId'] = len(spreadsheet['sheets'])
+                    spreadsheet['sheets'].append({'properties': properties})
+                    replies.append({'addSheet': {'properties': properties}})
+                else:
+                    replies.append({})
+            return {'spreadsheetId': spreadsheet_id, 'replies': replies}
+        if name == 'get':
+            return {'spreadsheetId': spreadsheet_id, 'sheets': spreadsheet['sheets']}
+        return {'spreadsheetId': spreadsheet_id}
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _handle(self, method):
+                length = int(self.headers.get('Content-Length') or 0)
+                raw = self.rfile.read(length) if length else b''
+                body = json.loads(raw) if raw else {}
+                path = unquote(urlparse(self.path).path)
+                status, payload = server._dispatch(method, path, body)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._handle('GET')
+
+            def do_POST(self):
+                self._handle('POST')
+
+            def do_PUT(self):
+                self._handle('PUT')
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,193 @@
+import os
+import tempfile
+import threading
+from datetime import datetime
+import httplib2
+import google_auth_httplib2
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.discovery import build
+from googleapiclient.http import HttpRequest
+
+import config
+
+
+def atomic_write(path, text):
+    """Write a file via a temp file and rename, so readers never see half a file"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, 'w') as tmp:
+            tmp.write(text)
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class CredentialManager:
+    """
+    Process-wide Google credentials
+    Loads token.json once, refreshes the token in the background before it
+    expires, and hands each thread its own authorized HTTP connection
+    """
+
+    def __init__(self, credentials_file=None, token_file=None, scopes=None):
+        self.credentials_file = credentials_file or config.CREDENTIALS_FILE
+        self.token_file = token_file or config.TOKEN_FILE
+        self.scopes = scopes or config.SHEETS_SCOPES
+        self.credentials = None
+        self.lock = threading.Lock()
+        self._local = threading.local()
+        self._stop = threading.Event()
+        self._refresher = None
+
+    def get_credentials(self):
+        """Load, refresh or obtain credentials; safe to call from any thread"""
+        with self.lock:
+            if self.credentials is None and os.path.exists(self.token_file):
+                # The token file stores the user's access and refresh tokens
+                self.credentials = Credentials.from_authorized_user_file(self.token_file, self.scopes)
+
+            creds = self.credentials
+            if not creds or not creds.valid:
+                if creds and creds.expired and creds.refresh_token:
+                    creds.refresh(Request())
+                else:
+                    if not os.path.exists(self.credentials_file):
+                        raise FileNotFoundError(
+                            "credentials.json not found. Please download it from Google Cloud Console."
+                        )
+                    flow = InstalledAppFlow.from_client_secrets_file(
+                        self.credentials_file, self.scopes
+                    )
+                    creds = flow.run_local_server(port=0)
+                self.credentials = creds
+                self._save(creds)
+
+            self._start_refresher()
+            return creds
+
+    def refresh(self):
+        """Refresh the access token now and persist it"""
+        with self.lock:
+            if not self.credentials or not self.credentials.refresh_token:
+                return
+            self.credentials.refresh(Request())
+            self._save(self.credentials)
+
+    def authorized_http(self):
+        """This thread's authorized HTTP connection; httplib2 is not thread-safe"""
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            http = google_auth_httplib2.AuthorizedHttp(
+                self.get_credentials(),
+                http=httplib2.Http(timeout=config.SHEETS_HTTP_TIMEOUT)
+            )
+            self._local.http = http
+        return http
+
+    def stop(self):
+        """Stop the background refresher"""
+        self._stop.set()
+
+    def _save(self, creds):
+        """Save the credentials for the next run"""
+        atomic_write(self.token_file, creds.to_json())
+
+    def _start_refresher(self):
+        """Start the background refresh thread once; caller holds the lock"""
+        if self._refresher is not None or not self.credentials.refresh_token:
+            return
+        self._refresher = threading.Thread(
+            target=self._refresh_loop,
+            name='google-token-refresher',
+            daemon=True
+        )
+        self._refresher.start()
+
+    def _refresh_loop(self):
+        while not self._stop.is_set():
+            expiry = self.credentials.expiry
+            if expiry is None:
+                wait = config.TOKEN_REFRESH_MARGIN
+            else:
+                # expiry is a naive UTC datetime
+                remaining = (expiry - datetime.utcnow()).total_seconds()
+                wait = max(0, remaining - config.TOKEN_REFRESH_MARGIN)
+            if self._stop.wait(wait):
+                return
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error refreshing Google token: {str(e)}")
+                self._stop.wait(config.RETRY_DELAY)
+
+
+_manager = None
+_service = None
+_resources = {}
+_client_lock = threading.Lock()
+
+
+def get_credential_manager():
+    """Process-wide credential manager"""
+    global _manager
+    with _client_lock:
+        if _manager is None:
+            _manager = CredentialManager()
+        return _manager
+
+
+def get_sheets_service():
+    """
+    Sheets service built once per process
+    Every request it creates runs on the calling thread's own authorized
+    connection, so the service can be shared between threads
+    """
+    global _service
+    manager = get_credential_manager()
+    with _client_lock:
+        if _service is None:
+            def build_request(http, *args, **kwargs):
+                return HttpRequest(manager.authorized_http(), *args, **kwargs)
+
+            _service = build(
+                'sheets', 'v4',
+                http=manager.authorized_http(),
+                requestBuilder=build_request
+            )
+        return _service
+
+
+def sheets_resources(service):
+    """
+    (spreadsheets(), spreadsheets().values()) resources for a service
+    Each resource build renders docstrings for every method from the
+    discovery document, which costs tens of milliseconds and megabytes,
+    so they are built once per service and shared
+    """
+    with _client_lock:
+        entry = _resources.get(id(service))
+        if entry is None or entry[0] is not service:
+            spreadsheets = service.spreadsheets()
+            entry = _resources[id(service)] = (service, spreadsheets, spreadsheets.values())
+        return entry[1], entry[2]
+
+
+def warm_up():
+    """Build the Sheets service in the background if a token is already saved"""
+    if not os.path.exists(config.TOKEN_FILE):
+        return
+
+    def run():
+        try:
+            get_sheets_service()
+        except Exception as e:
+            print(f"Error preparing Google Sheets client: {str(e)}")
+
+    threading.Thread(target=run, name='google-warm-up', daemon=True).start()
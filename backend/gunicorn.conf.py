@@ -0,0 +1,26 @@
+"""
+gunicorn settings for wsgi:app
+Without WORKER_MODE the scheduler, browsers and tracked sessions live in the
+API process, so a single process is used; in worker mode the API is
+stateless and can run GUNICORN_WORKERS processes
+"""
+
+# Not `config`: gunicorn reads every module-level name here as a setting
+import config as tracker_config
+
+bind = f'{tracker_config.FLASK_HOST}:{tracker_config.FLASK_PORT}'
+workers = tracker_config.GUNICORN_WORKERS if tracker_config.WORKER_MODE else 1
+# Threads, not async workers: live feeds block on a queue per viewer
+worker_class = 'gthread'
+threads = tracker_config.GUNICORN_THREADS
+timeout = 120
+# Leave room for app.shutdown() to finish before gunicorn kills the worker
+graceful_timeout = tracker_config.SHUTDOWN_TIMEOUT + 10
+loglevel = 'debug' if tracker_config.FLASK_DEBUG else 'info'
+accesslog = '-'
+
+
+def post_worker_init(worker):
+    """Stop scraping, flush Sheets writes and quit browsers before the worker exits"""
+    from app import install_signal_handlers
+    install_signal_handlers()
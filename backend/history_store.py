@@ -0,0 +1,135 @@
+import sqlite3
+import threading
+import time
+
+import config
+
+# Product field -> column; only these counters are tracked over time
+METRIC_COLUMNS = [
+    ('productClicks', 'product_clicks', 'INTEGER'),
+    ('ctr', 'ctr', 'REAL'),
+    ('ordersCreated', 'orders_created', 'INTEGER'),
+    ('itemsSold', 'items_sold', 'INTEGER'),
+    ('revenue', 'revenue', 'REAL')
+]
+
+
+class HistoryStore:
+    """
+    Embedded SQLite time-series of per-product metrics
+    A row is written only when a product's metrics change, and only the
+    changed columns are filled; unchanged columns stay NULL and are carried
+    forward when reading
+    """
+
+    def __init__(self, path=None):
+        self.path = path or config.HISTORY_DB_PATH
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        columns = ', '.join(f'{column} {kind}' for _, column, kind in METRIC_COLUMNS)
+        self.conn.execute(
+            f'CREATE TABLE IF NOT EXISTS samples ('
+            f'session_id TEXT NOT NULL, item_id TEXT NOT NULL, ts INTEGER NOT NULL, {columns})'
+        )
+        self.conn.execute(
+            'CREATE INDEX IF NOT EXISTS samples_session_item_ts '
+            'ON samples (session_id, item_id, ts)'
+        )
+        self.conn.commit()
+
+    def record(self, session_id, delta, ts=None):
+        """Record one scrape's ChangeDetector delta; returns the number of rows written"""
+        ts = int(ts if ts is not None else time.time())
+        rows = []
+        # New items (including every item after a restart) are stored in full
+        for product in delta.added:
+            values = tuple(product.get(field) for field, _, _ in METRIC_COLUMNS)
+            rows.append((session_id, product.key, ts) + values)
+        for product, fields in delta.changed:
+            stored = tuple(fields[field][1] if field in fields else None
+                           for field, _, _ in METRIC_COLUMNS)
+            if any(value is not None for value in stored):
+                rows.append((session_id, product.key, ts) + stored)
+
+        if rows:
+            placeholders = ', '.join('?' * (3 + len(METRIC_COLUMNS)))
+            with self.lock:
+                self.conn.executemany(f'INSERT INTO samples VALUES ({placeholders})', rows)
+                self.conn.commit()
+        return len(rows)
+
+    def query(self, session_id, item_id=None, start=None, end=None, step=None):
+        """
+        Metric history for a session as {itemId: [sample, ...]}
+        Samples are carried-forward snapshots; with step (seconds) only the
+        last sample in each step-sized bucket is returned
+        """
+        sql = 'SELECT item_id, ts, ' + ', '.join(c for _, c, _ in METRIC_COLUMNS) + \
+              ' FROM samples WHERE session_id = ?'
+        params = [session_id]
+        if item_id is not None:
+            sql += ' AND item_id = ?'
+            params.append(str(item_id))
+        if end is not None:
+            sql += ' AND ts <= ?'
+            params.append(int(end))
+        sql += ' ORDER BY item_id, ts'
+
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+
+        history = {}
+        current = {}
+        for row in rows:
+            item, ts, values = row[0], row[1], row[2:]
+            previous = current.get(item)
+            if previous is not None:
+                values = tuple(v if v is not None else old for v, old in zip(values, previous))
+            current[item] = values
+            if start is not None and ts < start:
+                continue
+
+            samples = history.get(item)
+            if samples is None:
+                samples = history[item] = []
+                if previous is not None and start is not None and ts > start:
+                    # Value in effect when the window opens
+                    samples.append(self._sample(start, previous))
+            sample = self._sample(ts, values)
+            if step and samples and samples[-1]['ts'] // step == ts // step:
+                samples[-1] = sample
+            else:
+                samples.append(sample)
+
+        if start is not None:
+            # Items that did not change inside the window
+            for item, values in current.items():
+                if item not in history:
+                    history[item] = [self._sample(start, values)]
+
+        return history
+
+    def _sample(self, ts, values):
+        sample = {'ts': ts}
+        for (field, _, _), value in zip(METRIC_COLUMNS, values):
+            sample[field] = value
+        return sample
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_history_store():
+    """Process-wide history store, created on first use"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = HistoryStore()
+        return _store
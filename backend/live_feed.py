@@ -0,0 +1,116 @@
+import json
+import queue
+import threading
+
+import config
+from products import json_default
+
+
+class LiveFeed:
+    """
+    Fans scrape results out to connected dashboard viewers
+    Each session has a single producer (its scrape cycle); events are
+    serialized once and copied to every subscriber's bounded queue, so
+    viewers add no scraping or Sheets load
+    """
+
+    def __init__(self, queue_size=None):
+        self.queue_size = queue_size or config.LIVE_FEED_QUEUE_SIZE
+        self.lock = threading.Lock()
+        self.subscribers = {}
+        self.latest = {}
+
+    def publish(self, session_id, delta):
+        """Publish a scrape's ChangeDetector delta with the full product list"""
+        event = delta.to_event()
+        event['sessionId'] = session_id
+        message = self._format('update', json.dumps(event, default=json_default))
+
+        with self.lock:
+            self.latest[session_id] = message
+            subscribers = list(self.subscribers.get(session_id, ()))
+        for subscriber in subscribers:
+            self._offer(subscriber, message)
+
+    def subscribe(self, session_id):
+        """Register a viewer; the latest result is queued for it straight away"""
+        subscriber = queue.Queue(maxsize=self.queue_size)
+        with self.lock:
+            self.subscribers.setdefault(session_id, set()).add(subscriber)
+            latest = self.latest.get(session_id)
+        if latest is not None:
+            self._offer(subscriber, latest)
+        return subscriber
+
+    def unsubscribe(self, session_id, subscriber):
+        with self.lock:
+            subscribers = self.subscribers.get(session_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self.subscribers[session_id]
+
+    def close_session(self, session_id):
+        """Tell viewers the session ended and forget its state"""
+        message = self._format('end', json.dumps({'sessionId': session_id}))
+        with self.lock:
+            subscribers = list(self.subscribers.get(session_id, ()))
+            self.latest.pop(session_id, None)
+        for subscriber in subscribers:
+            self._offer(subscriber, message)
+
+    def close_all(self):
+        """End every open stream, e.g. on shutdown"""
+        with self.lock:
+            session_ids = list(self.subscribers)
+        for session_id in session_ids:
+            self.close_session(session_id)
+
+    def viewer_count(self, session_id):
+        with self.lock:
+            return len(self.subscribers.get(session_id, ()))
+
+    def stream(self, session_id):
+        """Server-Sent Events generator for one viewer"""
+        subscriber = self.subscribe(session_id)
+        try:
+            while True:
+                try:
+                    message = subscriber.get(timeout=config.LIVE_FEED_HEARTBEAT)
+                except queue.Empty:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ': keep-alive\n\n'
+                    continue
+                yield message
+                if message.startswith('event: end'):
+                    return
+        finally:
+            self.unsubscribe(session_id, subscriber)
+
+    def _offer(self, subscriber, message):
+        """Queue a message, dropping the oldest one for a slow viewer"""
+        while True:
+            try:
+                subscriber.put_nowait(message)
+                return
+            except queue.Full:
+                try:
+                    subscriber.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def _format(self, event, data):
+        return f'event: {event}\ndata: {data}\n\n'
+
+
+_feed = None
+_feed_lock = threading.Lock()
+
+
+def get_live_feed():
+    """Process-wide live feed"""
+    global _feed
+    with _feed_lock:
+        if _feed is None:
+            _feed = LiveFeed()
+        return _feed
@@ -0,0 +1,240 @@
+"""
+Minimal Prometheus-style metrics
+Counters, gauges and histograms kept in process, rendered in the text
+exposition format by /metrics
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=None):
+    pairs = list(key) + (list(extra) if extra else [])
+    if not pairs:
+        return ''
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{name}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonically increasing value"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        with self.lock:
+            return self.values.get(_label_key(labels), 0)
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, key, value) for key, value in self.values.items()]
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def remove(self, **labels):
+        with self.lock:
+            self.values.pop(_label_key(labels), None)
+
+
+class Histogram:
+    """Distribution of observed values in cumulative buckets"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with-block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        result = []
+        with self.lock:
+            for key, (counts, total, count) in self.values.items():
+                for bound, bucket_count in zip(self.buckets, counts):
+                    result.append((f'{self.name}_bucket', key + (('le', _format_value(bound)),), bucket_count))
+                result.append((f'{self.name}_sum', key, total))
+                result.append((f'{self.name}_count', key, count))
+        return result
+
+
+class Registry:
+    """All metrics of the process plus callbacks evaluated at scrape time"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.collectors = []
+
+    def _register(self, metric):
+        with self.lock:
+            existing = self.metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self.metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help_text):
+        return self._register(Counter(name, help_text))
+
+    def gauge(self, name, help_text):
+        return self._register(Gauge(name, help_text))
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, buckets))
+
+    def add_collector(self, collector):
+        """
+        Register a callable run on every render
+        It yields (name, help, kind, [(labels dict, value), ...]) tuples
+        """
+        with self.lock:
+            self.collectors.append(collector)
+
+    def render(self):
+        """Text exposition format"""
+        with self.lock:
+            metrics = list(self.metrics.values())
+            collectors = list(self.collectors)
+
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, key, value in metric.samples():
+                lines.append(f'{name}{_format_labels(key)} {_format_value(value)}')
+
+        for collector in collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                print(f"Error collecting metrics: {str(e)}")
+                continue
+            for name, help_text, kind, samples in families:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_format_labels(_label_key(labels))} {_format_value(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# Scraper hot path
+PAGE_LOAD_SECONDS = REGISTRY.histogram(
+    'letu_scrape_page_load_seconds', 'Time to load the dashboard page')
+PAGE_REFRESH_SECONDS = REGISTRY.histogram(
+    'letu_scrape_page_refresh_seconds', 'Time to refresh productList in place')
+READY_TIMEOUTS_TOTAL = REGISTRY.counter(
+    'letu_scrape_ready_timeouts_total', 'Page loads that hit BROWSER_TIMEOUT before data arrived')
+LOG_EXTRACT_SECONDS = REGISTRY.histogram(
+    'letu_scrape_log_extract_seconds', 'Time to extract productList responses from the tab')
+JSON_PARSE_SECONDS = REGISTRY.histogram(
+    'letu_scrape_json_parse_seconds', 'Time to decode and parse productList bodies')
+HTTP_POLL_SECONDS = REGISTRY.histogram(
+    'letu_scrape_http_poll_seconds', 'Time to fetch productList directly over HTTP')
+DOM_FALLBACK_TOTAL = REGISTRY.counter(
+    'letu_scrape_dom_fallback_total', 'Scrapes that fell back to DOM parsing')
+DOM_EXTRACT_SECONDS = REGISTRY.histogram(
+    'letu_scrape_dom_extract_seconds', 'Time spent in DOM extraction')
+SCRAPE_MODE_TOTAL = REGISTRY.counter(
+    'letu_scrape_total', 'Scrapes by path taken')
+
+# Google Sheets
+SHEETS_REQUEST_SECONDS = REGISTRY.histogram(
+    'letu_sheets_request_seconds', 'Google Sheets API call latency')
+SHEETS_QUOTA_ERRORS_TOTAL = REGISTRY.counter(
+    'letu_sheets_quota_errors_total', 'Google Sheets API calls rejected with 429')
+SHEETS_ERRORS_TOTAL = REGISTRY.counter(
+    'letu_sheets_errors_total', 'Google Sheets API calls that failed')
+
+# Sessions
+CYCLE_SECONDS = REGISTRY.histogram(
+    'letu_session_cycle_seconds', 'Duration of a full scrape cycle')
+SESSION_LAST_CYCLE_SECONDS = REGISTRY.gauge(
+    'letu_session_last_cycle_seconds', 'Duration of the last scrape cycle per session')
+CYCLE_ERRORS_TOTAL = REGISTRY.counter(
+    'letu_session_cycle_errors_total', 'Scrape cycles that raised an error')
+
+# Output sinks
+SINK_WRITE_SECONDS = REGISTRY.histogram(
+    'letu_sink_write_seconds', 'Time a sink spends on one delta')
+SINK_COALESCED_TOTAL = REGISTRY.counter(
+    'letu_sink_coalesced_total', 'Deltas merged into a later one because a sink fell behind')
+SINK_ERRORS_TOTAL = REGISTRY.counter(
+    'letu_sink_errors_total', 'Sink writes and flushes that raised an error')
+
+
+@contextmanager
+def sheets_call(method):
+    """Time a Sheets API call and count quota errors"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        status = getattr(getattr(e, 'resp', None), 'status', None)
+        if status == 429:
+            SHEETS_QUOTA_ERRORS_TOTAL.inc(method=method)
+        SHEETS_ERRORS_TOTAL.inc(method=method, status=status or 'error')
+        raise
+    finally:
+        SHEETS_REQUEST_SECONDS.observe(time.perf_counter() - started, method=method)
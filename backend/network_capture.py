@@ -0,0 +1,198 @@
+import json
+import time
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+
+import config
+
+# Injected into the tab before any page script runs. Wraps fetch and XHR so
+# only responses whose URL matches the pattern are kept, newest per page.
+CAPTURE_SCRIPT = '''
+(function () {
+  if (window.__letuCapture) { return; }
+  var pattern = %(pattern)s;
+  var pageParams = %(page_params)s;
+  var store = window.__letuCapture = {pages: {}, seq: 0};
+
+  function pageKey(url) {
+    try {
+      var params = new URL(url, location.href).searchParams;
+      for (var i = 0; i < pageParams.length; i++) {
+        if (params.has(pageParams[i])) { return params.get(pageParams[i]); }
+      }
+    } catch (e) {}
+    return '0';
+  }
+
+  function keep(url, text) {
+    store.seq += 1;
+    store.pages[pageKey(url)] = {url: String(url), body: text, seq: store.seq};
+  }
+
+  function matches(url) {
+    return url && String(url).indexOf(pattern) !== -1;
+  }
+
+  var originalFetch = window.fetch;
+  if (originalFetch) {
+    window.fetch = function () {
+      return originalFetch.apply(this, arguments).then(function (response) {
+        try {
+          if (matches(response.url)) {
+            response.clone().text().then(function (text) { keep(response.url, text); });
+          }
+        } catch (e) {}
+        return response;
+      });
+    };
+  }
+
+  var originalOpen = XMLHttpRequest.prototype.open;
+  XMLHttpRequest.prototype.open = function (method, url) {
+    this.__letuUrl = url;
+    return originalOpen.apply(this, arguments);
+  };
+
+  var originalSend = XMLHttpRequest.prototype.send;
+  XMLHttpRequest.prototype.send = function () {
+    var xhr = this;
+    if (matches(xhr.__letuUrl)) {
+      xhr.addEventListener('load', function () {
+        try {
+          var text = (xhr.responseType === '' || xhr.responseType === 'text')
+            ? xhr.responseText : JSON.stringify(xhr.response);
+          keep(xhr.responseURL || xhr.__letuUrl, text);
+        } catch (e) {}
+      });
+    }
+    return originalSend.apply(this, arguments);
+  };
+})();
+'''
+
+# Hands captured pages to Python and empties the store
+COLLECT_SCRIPT = '''
+var store = window.__letuCapture;
+if (!store) { return null; }
+var pages = store.pages;
+store.pages = {};
+return Object.keys(pages).map(function (key) {
+  return {page: key, url: pages[key].url, body: pages[key].body, seq: pages[key].seq};
+});
+'''
+
+# Capture progress and product table size, polled while waiting for the page
+READY_SCRIPT = '''
+var store = window.__letuCapture;
+var selector = arguments[0];
+return {
+  seq: store ? store.seq : null,
+  failed: store ? (store.failed || 0) : 0,
+  rows: selector ? document.querySelectorAll(selector).length : 0,
+  loaded: document.readyState === 'complete'
+};
+'''
+
+# Re-requests the known productList URLs from inside the page so the hook
+# captures fresh responses without a navigation. Returns the capture seq to
+# wait from, or null if the tab is not on the dashboard any more.
+REFRESH_SCRIPT = '''
+var urls = arguments[0], marker = arguments[1];
+var store = window.__letuCapture;
+if (!store || !window.fetch || location.href.indexOf(marker) === -1) { return null; }
+store.failed = 0;
+var seq = store.seq;
+urls.forEach(function (url) {
+  window.fetch(url, {credentials: 'include'}).catch(function () {
+    store.failed = (store.failed || 0) + 1;
+  });
+});
+return seq;
+'''
+
+
+class ProductListCapture:
+    """
+    Persistent capture of productList responses inside one browser tab
+    The capture hook is registered once per tab and keeps only the newest
+    matching response per page, so nothing else on the page is decoded
+    """
+
+    def __init__(self, session_id, url_pattern=None, page_params=None):
+        self.session_id = session_id
+        self.url_pattern = url_pattern or config.PRODUCT_LIST_URL_PATTERN
+        self.page_params = page_params or config.PRODUCT_LIST_PAGE_PARAMS
+        self._installed_handle = None
+        self._script = CAPTURE_SCRIPT % {
+            'pattern': json.dumps(self.url_pattern),
+            'page_params': json.dumps(self.page_params)
+        }
+
+    def install(self, driver):
+        """
+        Register the capture hook for the current tab, once per tab
+        Returns True when the tab is new and still has to load the dashboard
+        """
+        handle = driver.current_window_handle
+        if handle == self._installed_handle:
+            return False
+        driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {'source': self._script})
+        self._installed_handle = handle
+        return True
+
+    def wait_ready(self, driver, since=0, expected=1, row_selector=None, timeout=None):
+        """
+        Wait until `expected` productList responses arrived after capture seq
+        `since`, or the product table matched by row_selector has rendered
+        Returns 'capture', 'dom', or None on timeout or failed requests
+        """
+        timeout = config.BROWSER_TIMEOUT if timeout is None else timeout
+        rows_seen = []
+
+        def ready(driver):
+            state = driver.execute_script(READY_SCRIPT, row_selector)
+            if state['seq'] is not None and state['seq'] - since >= expected:
+                return 'capture'
+            if state['failed']:
+                return 'failed'
+            if state['rows'] and state['loaded']:
+                # The hook may still be reading the response body
+                if state['seq'] is None:
+                    return 'dom'
+                if not rows_seen:
+                    rows_seen.append(time.monotonic())
+                elif time.monotonic() - rows_seen[0] >= config.READY_DOM_GRACE:
+                    return 'dom'
+            return False
+
+        try:
+            reason = WebDriverWait(driver, timeout, poll_frequency=config.READY_POLL_INTERVAL).until(ready)
+        except TimeoutException:
+            return None
+        return None if reason == 'failed' else reason
+
+    def refresh(self, driver, urls, page_marker, timeout=None):
+        """
+        Refetch the known productList URLs in place and wait for the responses
+        Returns False if the tab has left the dashboard or the refresh failed
+        """
+        since = driver.execute_script(REFRESH_SCRIPT, urls, page_marker)
+        if since is None:
+            return False
+        return self.wait_ready(driver, since=since, expected=len(urls), timeout=timeout) == 'capture'
+
+    def collect(self, driver):
+        """
+        Newest captured responses since the last call, ordered by page
+        Returns None if the hook is not active in the current document
+        """
+        pages = driver.execute_script(COLLECT_SCRIPT)
+        if pages is None:
+            return None
+        return sorted(pages, key=lambda page: self._page_order(page['page']))
+
+    def _page_order(self, key):
+        try:
+            return (0, float(key), '')
+        except (TypeError, ValueError):
+            return (1, 0, str(key))
@@ -0,0 +1,72 @@
+import threading
+import time
+
+import config
+
+
+class _InFlight:
+    """A preview scrape that other requests can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class PreviewCache:
+    """
+    TTL cache for preview results, keyed by session_id
+    Concurrent requests for the same session share one in-flight scrape
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = config.PREVIEW_CACHE_TTL if ttl is None else ttl
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.in_flight = {}
+
+    def get(self, session_id, loader):
+        """Cached result for session_id, calling loader() at most once at a time"""
+        with self.lock:
+            entry = self.entries.get(session_id)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    return entry[1]
+                del self.entries[session_id]
+
+            pending = self.in_flight.get(session_id)
+            leader = pending is None
+            if leader:
+                pending = self.in_flight[session_id] = _InFlight()
+
+        if not leader:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.result
+
+        try:
+            pending.result = loader()
+            # Empty results usually mean a failed scrape; don't pin them for the TTL
+            if pending.result:
+                with self.lock:
+                    self._prune()
+                    self.entries[session_id] = (time.monotonic() + self.ttl, pending.result)
+            return pending.result
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            with self.lock:
+                self.in_flight.pop(session_id, None)
+            pending.done.set()
+
+    def _prune(self):
+        """Drop expired entries of sessions nobody previews anymore; caller holds the lock"""
+        now = time.monotonic()
+        for session_id in [session_id for session_id, entry in self.entries.items() if entry[0] <= now]:
+            del self.entries[session_id]
+
+    def invalidate(self, session_id):
+        with self.lock:
+            self.entries.pop(session_id, None)
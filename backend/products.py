@@ -0,0 +1,117 @@
+from operator import attrgetter
+
+import config
+
+# Fields kept as text; every other field in PRODUCT_FIELDS is numeric
+TEXT_FIELDS = ('title', 'coverImage')
+
+
+def _text(value):
+    return '' if value is None else str(value)
+
+
+def _number(value):
+    """Numbers pass through; None, bools and unparseable strings become 0"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        try:
+            number = float(value)
+        except ValueError:
+            return 0
+        return int(number) if number.is_integer() else number
+    return 0
+
+
+def _converter(field):
+    if field == 'itemId':
+        return None
+    if field in TEXT_FIELDS:
+        return _text
+    return _number
+
+
+# (field, normaliser) in PRODUCT_FIELDS order; itemId is kept as given
+_FIELD_CONVERTERS = tuple((field, _converter(field)) for field in config.PRODUCT_FIELDS)
+
+
+_field_values = attrgetter(*config.PRODUCT_FIELDS)
+
+
+class ProductRecord:
+    """
+    One product from a productList response, with one slot per
+    config.PRODUCT_FIELDS entry
+    Values are normalised once when parsed, and the slot order is the
+    sheet column order, so rows are built without intermediate dicts.
+    Supports product.get(field) and product[field] like the dicts it replaces
+    """
+
+    __slots__ = tuple(config.PRODUCT_FIELDS)
+
+    @classmethod
+    def from_json(cls, item):
+        """Build a record from one data.list entry of a productList response"""
+        record = object.__new__(cls)
+        for field, convert in _FIELD_CONVERTERS:
+            value = item.get(field)
+            setattr(record, field, value if convert is None else convert(value))
+        return record
+
+    @classmethod
+    def from_dict(cls, product):
+        """Dicts from the DOM fallback or callers use the same keys"""
+        return cls.from_json(product)
+
+    def get(self, field, default=None):
+        return getattr(self, field, default)
+
+    def __getitem__(self, field):
+        try:
+            return getattr(self, field)
+        except (AttributeError, TypeError):
+            raise KeyError(field)
+
+    def __eq__(self, other):
+        if not isinstance(other, ProductRecord):
+            return NotImplemented
+        return self.values() == other.values()
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f'ProductRecord({self.to_dict()!r})'
+
+    @property
+    def key(self):
+        """Identify a product by itemId, falling back to the title"""
+        if self.itemId is not None:
+            return str(self.itemId)
+        return self.title
+
+    def values(self):
+        """Field values in PRODUCT_FIELDS order"""
+        return _field_values(self)
+
+    def to_dict(self):
+        return dict(zip(self.__slots__, _field_values(self)))
+
+    def to_row(self):
+        """Sheet row in column order, without the timestamp column"""
+        row = list(_field_values(self))
+        row[0] = '' if row[0] is None else str(row[0])
+        return row
+
+
+def as_record(product):
+    """Accept either a ProductRecord or a plain product dict"""
+    if isinstance(product, ProductRecord):
+        return product
+    return ProductRecord.from_dict(product)
+
+
+def json_default(value):
+    """json.dumps default= hook so records serialise like dicts"""
+    if isinstance(value, ProductRecord):
+        return value.to_dict()
+    return str(value)
@@ -0,0 +1,250 @@
+import heapq
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+
+# Returned by a job to unschedule itself
+STOP = object()
+
+
+class AdaptiveInterval:
+    """
+    Per-session scrape interval driven by how much the product list changes
+    Big changes halve the interval down to the minimum, unchanged data
+    stretches it toward the maximum, and a stream with no changes for
+    idle_timeout seconds is reported as finished
+    """
+
+    def __init__(self, base=None, minimum=None, maximum=None, idle_timeout=None,
+                 fast_ratio=None):
+        self.base = base or config.SCRAPE_INTERVAL
+        self.minimum = minimum or config.SCRAPE_INTERVAL_MIN
+        self.maximum = maximum or config.SCRAPE_INTERVAL_MAX
+        self.idle_timeout = config.STREAM_END_IDLE_SECONDS if idle_timeout is None else idle_timeout
+        self.fast_ratio = fast_ratio or config.ADAPTIVE_FAST_CHANGE_RATIO
+        self.interval = self.base
+        self.last_change = time.monotonic()
+
+    def observe(self, changed, total):
+        """Record one scrape's change count and return the next interval"""
+        if not total:
+            # Failed or empty scrape tells us nothing about the stream
+            return self.interval
+
+        if changed:
+            self.last_change = time.monotonic()
+            if changed / total >= self.fast_ratio:
+                self.interval = max(self.minimum, self.interval / 2)
+            else:
+                # Moderate activity drifts back toward the configured interval
+                self.interval = max(self.minimum, min(self.maximum, (self.interval + self.base) / 2))
+        else:
+            self.interval = min(self.maximum, self.interval * 1.5)
+        return self.interval
+
+    def finished(self):
+        """True once nothing has changed for idle_timeout seconds"""
+        return bool(self.idle_timeout) and time.monotonic() - self.last_change >= self.idle_timeout
+
+
+class _ScheduledJob:
+    """Bookkeeping for one session's recurring job"""
+
+    def __init__(self, session_id, job, on_stop=None):
+        self.session_id = session_id
+        self.job = job
+        self.on_stop = on_stop
+        self.next_run = None
+        self.last_run = None
+        self.last_error = None
+        self.failures = 0
+        self.running = False
+        self.removed = False
+
+
+class ScrapeScheduler:
+    """
+    Central scheduler for every tracked session
+    A single dispatcher thread keeps a heap of due times and hands jobs to a
+    bounded worker pool, so the number of threads does not grow with sessions
+    """
+
+    def __init__(self, interval=None, max_workers=None, retry_delay=None,
+                 max_backoff=None, jitter=None, start_jitter=None):
+        self.interval = interval or config.SCRAPE_INTERVAL
+        self.max_workers = max_workers or config.MAX_CONCURRENT_SESSIONS
+        self.retry_delay = retry_delay or config.RETRY_DELAY
+        self.max_backoff = max_backoff or config.MAX_RETRY_DELAY
+        self.jitter = config.SCRAPE_JITTER if jitter is None else jitter
+        self.start_jitter = config.SCRAPE_START_JITTER if start_jitter is None else start_jitter
+
+        self._jobs = {}
+        self._heap = []
+        self._seq = 0
+        self._running_count = 0
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._executor = None
+        self._dispatcher = None
+
+    def start(self):
+        """Start the dispatcher thread and worker pool"""
+        with self._condition:
+            if self._dispatcher is not None:
+                return
+            self._stopping = False
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix='scrape-worker'
+            )
+            self._dispatcher = threading.Thread(
+                target=self._dispatch_loop,
+                name='scrape-scheduler',
+                daemon=True
+            )
+            self._dispatcher.start()
+
+    def add(self, session_id, job, on_stop=None):
+        """
+        Schedule job() to run repeatedly for session_id
+        job may return a delay in seconds for its next run; None means the
+        default interval and STOP unschedules it, after which on_stop() is called
+        """
+        with self._condition:
+            if session_id in self._jobs:
+                raise ValueError(f"Session {session_id} is already scheduled")
+            scheduled = _ScheduledJob(session_id, job, on_stop)
+            self._jobs[session_id] = scheduled
+            # Spread start times so sessions don't poll in lockstep
+            self._push(scheduled, random.uniform(0, self.start_jitter))
+        self.start()
+
+    def remove(self, session_id, timeout=None):
+        """Unschedule a session, waiting up to timeout for a running job to finish"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            scheduled = self._jobs.pop(session_id, None)
+            if scheduled is None:
+                return False
+            scheduled.removed = True
+            while scheduled.running:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return True
+
+    def is_scheduled(self, session_id):
+        with self._condition:
+            return session_id in self._jobs
+
+    def status(self, session_id):
+        """Scheduling state for a session, or None if it is not scheduled"""
+        with self._condition:
+            scheduled = self._jobs.get(session_id)
+            if scheduled is None:
+                return None
+            return {
+                'running': scheduled.running,
+                'nextRun': scheduled.next_run,
+                'lastRun': scheduled.last_run,
+                'failures': scheduled.failures,
+                'lastError': scheduled.last_error
+            }
+
+    def stop(self, timeout=None):
+        """Stop dispatching and wait up to timeout for running jobs"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+            while self._running_count:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            executor = self._executor
+            dispatcher = self._dispatcher
+            self._executor = None
+            self._dispatcher = None
+        if dispatcher is not None:
+            dispatcher.join(timeout=1)
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _push(self, scheduled, delay):
+        """Queue the next run of a job; caller holds the condition"""
+        scheduled.next_run = time.time() + delay
+        self._seq += 1
+        heapq.heappush(self._heap, (time.monotonic() + delay, self._seq, scheduled))
+        self._condition.notify_all()
+
+    def _next_delay(self, scheduled, result):
+        """Delay before the next run, with backoff after failures"""
+        if scheduled.failures:
+            delay = min(self.retry_delay * 2 ** (scheduled.failures - 1), self.max_backoff)
+        elif result is None:
+            delay = self.interval
+        else:
+            delay = result
+        return max(0, delay * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    def _dispatch_loop(self):
+        with self._condition:
+            while not self._stopping:
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+
+                due, _, scheduled = self._heap[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+                if self._running_count >= self.max_workers:
+                    self._condition.wait()
+                    continue
+
+                heapq.heappop(self._heap)
+                if scheduled.removed:
+                    continue
+
+                scheduled.running = True
+                self._running_count += 1
+                self._executor.submit(self._run, scheduled)
+
+    def _run(self, scheduled):
+        result = None
+        error = None
+        try:
+            result = scheduled.job()
+        except Exception as e:
+            error = e
+            print(f"Error in scrape job for session {scheduled.session_id}: {str(e)}")
+
+        with self._condition:
+            scheduled.running = False
+            scheduled.last_run = time.time()
+            self._running_count -= 1
+            if error is None:
+                scheduled.failures = 0
+                scheduled.last_error = None
+            else:
+                scheduled.failures += 1
+                scheduled.last_error = str(error)
+            stopped = result is STOP and not scheduled.removed
+            if stopped:
+                scheduled.removed = True
+                self._jobs.pop(scheduled.session_id, None)
+            elif not scheduled.removed and not self._stopping:
+                self._push(scheduled, self._next_delay(scheduled, result))
+            self._condition.notify_all()
+
+        if stopped and scheduled.on_stop is not None:
+            try:
+                scheduled.on_stop()
+            except Exception as e:
+                print(f"Error stopping session {scheduled.session_id}: {str(e)}")
@@ -1,169 +1,241 @@
-import time
 import json
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
+import requests
+
+import config
+from browser_pool import get_pool
+from shopee_api import ProductListClient, AuthExpiredError
+from network_capture import ProductListCapture
+from dom_extract import DomTableExtractor
+from failures import ScrapeError, DriverError, LoginRequiredError, PageLoadError, classify, is_driver_failure
+from products import ProductRecord
+import metrics
 
 class ShopeeStreamScraper:
     """Scraper for Shopee livestream product data"""
     
-    def __init__(self, session_id):
+    # Lets close() (and __del__) run if pool.acquire() raises in __init__
+    lease = None
+    
+    def __init__(self, session_id, pool=None, lease_key=None):
+        """
+        lease_key names the pool tab (default session_id); one-off scrapes
+        pass their own so they never drive a tracked session's tab
+        """
         self.session_id = session_id
         self.url = f"https://svcs-admin.shopee.vn/dashboard/stream?sessionId={session_id}"
         self.driver = None
-        self._setup_driver()
-    
-    def _setup_driver(self):
-        """Setup Chrome WebDriver with headless options"""
-        chrome_options = Options()
-        chrome_options.add_argument('--headless')
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        chrome_options.add_argument('--disable-gpu')
-        chrome_options.add_argument('--window-size=1920,1080')
-        chrome_options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36')
-        
-        # Install and setup ChromeDriver automatically
-        service = Service(ChromeDriverManager().install())
-        self.driver = webdriver.Chrome(service=service, options=chrome_options)
+        self.pool = pool or get_pool()
+        self.lease = self.pool.acquire(lease_key or session_id)
+        self.api = ProductListClient(session_id)
+        self.capture = ProductListCapture(session_id)
+        self.dom = DomTableExtractor()
+        self._product_list_urls = []
     
     def scrape_products(self):
         """
         Scrape product data from the livestream session
-        Returns list of product dictionaries
+        Returns a list of ProductRecords; an empty list means the stream
+        currently lists no products. Raises a ScrapeError subclass
+        (DriverError, LoginRequiredError, PageLoadError) when no data could
+        be read, so the caller can recover() and back off
         """
+        if config.SCRAPE_MODE == 'http' and self.api.has_auth():
+            try:
+                with metrics.HTTP_POLL_SECONDS.time():
+                    products = self._fetch_direct()
+                metrics.SCRAPE_MODE_TOTAL.inc(path='http')
+                return products
+            except AuthExpiredError as e:
+                print(f"Direct polling auth expired, falling back to browser: {str(e)}")
+                self.api.reset()
+            except requests.RequestException as e:
+                print(f"Direct polling failed, falling back to browser: {str(e)}")
+        
+        return self._scrape_with_browser()
+    
+    def _fetch_direct(self):
+        """Fetch every productList page over HTTP, skipping the browser"""
+        return self._merge_pages(
+            self._parse_product_list(self.api.fetch(url)) for url in self.api.urls
+        )
+    
+    def _scrape_with_browser(self):
+        """Load the dashboard in the browser and extract products from it"""
         try:
-            # Navigate to the page
-            self.driver.get(self.url)
-            
-            # Wait for the page to load
-            time.sleep(3)
-            
-            # Method 1: Try to intercept network requests for productList API
-            products = self._extract_from_network_logs()
-            
-            if not products:
-                # Method 2: Fallback to DOM parsing
-                products = self._extract_from_dom()
-            
-            return products
+            with self.lease.use() as driver:
+                self.driver = driver
+                
+                # Hook productList responses before the page's own scripts run
+                new_tab = self.capture.install(self.driver)
+                
+                products = []
+                if not new_tab and self._product_list_urls:
+                    # The dashboard is already open: refetch its data in place
+                    with metrics.PAGE_REFRESH_SECONDS.time():
+                        refreshed = self.capture.refresh(
+                            self.driver, self._product_list_urls, f"sessionId={self.session_id}"
+                        )
+                    if refreshed:
+                        with metrics.LOG_EXTRACT_SECONDS.time():
+                            products = self._extract_from_network_logs()
+                
+                if not products:
+                    with metrics.PAGE_LOAD_SECONDS.time():
+                        # Navigate to the page and wait for productList or the table
+                        self.driver.get(self.url)
+                        ready = self.capture.wait_ready(
+                            self.driver, row_selector=config.DOM_SELECTORS['row']
+                        )
+                    if ready is None:
+                        metrics.READY_TIMEOUTS_TOTAL.inc()
+                    
+                    # Method 1: Try to intercept network requests for productList API
+                    with metrics.LOG_EXTRACT_SECONDS.time():
+                        products = self._extract_from_network_logs()
+                
+                if products and config.SCRAPE_MODE == 'http':
+                    # Later cycles can poll the API directly with these cookies
+                    self.api.load_auth(self.driver, self._product_list_urls, self.url)
+                
+                if not products:
+                    if self._on_login_page():
+                        raise LoginRequiredError(f"Dashboard redirected to {self.driver.current_url}")
+                    
+                    # Method 2: Fallback to DOM parsing
+                    metrics.DOM_FALLBACK_TOTAL.inc()
+                    with metrics.DOM_EXTRACT_SECONDS.time():
+                        products = self._extract_from_dom()
+                    metrics.SCRAPE_MODE_TOTAL.inc(path='dom')
+                    
+                    if not products and ready is None:
+                        raise PageLoadError(f"No product data within {config.BROWSER_TIMEOUT}s")
+                else:
+                    metrics.SCRAPE_MODE_TOTAL.inc(path='browser')
+                
+                return products
             
+        except ScrapeError:
+            raise
         except Exception as e:
-            print(f"Error scraping products: {str(e)}")
-            return []
+            raise classify(e) from e
+        finally:
+            self.driver = None
+    
+    def _on_login_page(self):
+        """True if the tab was sent to a login page instead of the dashboard"""
+        url = (self.driver.current_url or '').lower()
+        return any(marker in url for marker in config.LOGIN_URL_MARKERS)
+    
+    def recover(self, error):
+        """
+        Repair what a failed cycle broke before the next attempt
+        Every failure forces a full page load next time; a dead driver or
+        crashed tab gets a restarted browser or a fresh tab, and a login
+        redirect also drops the cookies used for direct polling, so they
+        are captured again from the browser once its session is valid
+        """
+        self._product_list_urls = []
+        if isinstance(error, LoginRequiredError):
+            self.api.reset()
+        if isinstance(error, (DriverError, LoginRequiredError)) and self.lease:
+            self.lease.reset()
     
     def _extract_from_network_logs(self):
-        """Extract product data from network logs (XHR requests)"""
+        """Extract product data from captured productList responses (XHR requests)"""
         try:
-            # Enable Performance Logging
-            self.driver.execute_cdp_cmd('Network.enable', {})
+            pages = self.capture.collect(self.driver)
             
-            # Get network logs
-            logs = self.driver.get_log('performance')
+            if pages is None:
+                # Capture hook not active in this document, read the performance log
+                pages = self._read_performance_log() if config.PERFORMANCE_LOG_FALLBACK else []
             
-            products = []
-            for entry in logs:
-                try:
-                    log = json.loads(entry['message'])['message']
-                    
-                    # Look for productList API response
-                    if 'Network.responseReceived' in log['method']:
-                        response_url = log['params'].get('response', {}).get('url', '')
-                        
-                        if 'productList' in response_url and 'sessionId' in response_url:
-                            # Get the response body
-                            request_id = log['params']['requestId']
-                            response = self.driver.execute_cdp_cmd(
-                                'Network.getResponseBody', 
-                                {'requestId': request_id}
-                            )
-                            
-                            body = json.loads(response['body'])
-                            
-                            # Extract product list from response
-                            if 'data' in body and 'list' in body['data']:
-                                for product in body['data']['list']:
-                                    products.append({
-                                        'itemId': product.get('itemId'),
-                                        'title': product.get('title'),
-                                        'coverImage': product.get('coverImage'),
-                                        'maxPrice': product.get('maxPrice', 0),
-                                        'minPrice': product.get('minPrice', 0),
-                                        'productClicks': product.get('productClicks', 0),
-                                        'ctr': product.get('ctr', 0),
-                                        'ordersCreated': product.get('ordersCreated', 0),
-                                        'revenue': product.get('revenue', 0),
-                                        'itemsSold': product.get('itemsSold', 0)
-                                    })
-                            break
-                            
-                except Exception as e:
-                    continue
+            page_products = []
+            urls = []
+            with metrics.JSON_PARSE_SECONDS.time():
+                for page in pages:
+                    try:
+                        body = json.loads(page['body'])
+                    except (TypeError, ValueError):
+                        continue
+                    urls.append(page['url'])
+                    page_products.append(self._parse_product_list(body))
+            
+            if urls:
+                self._product_list_urls = urls
             
-            return products
+            return self._merge_pages(page_products)
             
         except Exception as e:
+            if is_driver_failure(e):
+                raise
             print(f"Error extracting from network logs: {str(e)}")
             return []
     
-    def _extract_from_dom(self):
-        """Fallback method: Extract product data from DOM elements"""
-        try:
-            products = []
-            
-            # Wait for product list to load
-            wait = WebDriverWait(self.driver, 10)
-            
-            # This is a fallback - you'll need to adjust selectors based on actual DOM
-            # Look for product rows in the table
-            product_rows = self.driver.find_elements(By.CSS_SELECTOR, 'tr')
+    def _read_performance_log(self):
+        """Newest productList response for this session from the performance log"""
+        logs = self.driver.get_log('performance')
+        
+        # Newest entries last; stop at the first (most recent) match
+        for entry in reversed(logs):
+            message = entry['message']
+            # Cheap text filter before decoding the entry
+            if 'Network.responseReceived' not in message or self.capture.url_pattern not in message:
+                continue
             
-            for row in product_rows:
-                try:
-                    # Extract data from table cells
-                    cells = row.find_elements(By.TAG_NAME, 'td')
+            try:
+                log = json.loads(message)['message']
+                response_url = log['params'].get('response', {}).get('url', '')
+                
+                # The browser is shared, so match this session's request only
+                if self.capture.url_pattern in response_url and f'sessionId={self.session_id}' in response_url:
+                    response = self.driver.execute_cdp_cmd(
+                        'Network.getResponseBody', 
+                        {'requestId': log['params']['requestId']}
+                    )
+                    return [{'page': '0', 'url': response_url, 'body': response['body']}]
                     
-                    if len(cells) >= 6:
-                        product = {
-                            'title': cells[0].text,
-                            'productClicks': self._parse_number(cells[1].text),
-                            'ctr': self._parse_percentage(cells[2].text),
-                            'ordersCreated': self._parse_number(cells[3].text),
-                            'itemsSold': self._parse_number(cells[4].text),
-                        }
-                        products.append(product)
-                        
-                except Exception as e:
-                    continue
-            
-            return products
-            
-        except Exception as e:
-            print(f"Error extracting from DOM: {str(e)}")
-            return []
+            except Exception:
+                continue
+        
+        return []
     
-    def _parse_number(self, text):
-        """Parse number from text, removing commas and special characters"""
-        try:
-            return int(text.replace(',', '').replace('.', ''))
-        except:
-            return 0
+    def _merge_pages(self, pages):
+        """Concatenate paginated product lists, dropping items repeated across pages"""
+        products = []
+        seen = set()
+        for page in pages:
+            for product in page:
+                item_id = product.get('itemId')
+                # Pages can overlap while the list is changing
+                if item_id is not None:
+                    if item_id in seen:
+                        continue
+                    seen.add(item_id)
+                products.append(product)
+        return products
+    
+    def _parse_product_list(self, body):
+        """Extract product list from a productList response body"""
+        data = body.get('data') if isinstance(body, dict) else None
+        if not isinstance(data, dict) or 'list' not in data:
+            return []
+        return [ProductRecord.from_json(product) for product in data['list']]
     
-    def _parse_percentage(self, text):
-        """Parse percentage from text"""
+    def _extract_from_dom(self):
+        """Fallback method: Extract product data from the product table in one script call"""
         try:
-            return float(text.replace('%', ''))
-        except:
-            return 0.0
+            return self.dom.extract(self.driver)
+        except Exception as e:
+            if is_driver_failure(e):
+                raise
+            print(f"Error extracting from DOM: {str(e)}")
+            return []
     
     def close(self):
-        """Close the WebDriver"""
-        if self.driver:
-            self.driver.quit()
+        """Give the browser tab back to the pool"""
+        if self.lease:
+            self.pool.release(self.lease)
+            self.lease = None
     
     def __del__(self):
         """Cleanup on deletion"""
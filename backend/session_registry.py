@@ -0,0 +1,101 @@
+import json
+import os
+import threading
+import time
+
+import config
+from google_client import atomic_write
+
+
+class SessionRegistry:
+    """
+    Durable record of tracked sessions, kept as a JSON journal
+    Each entry holds the session's config, its last successful scrape and a
+    hash of the rows last written to its sheet. The file is replaced
+    atomically, so a crash never leaves a half-written registry behind.
+    Frequent per-cycle updates are batched into at most one write per
+    save_interval seconds
+    """
+
+    def __init__(self, path=None, save_interval=None):
+        self.path = path or config.SESSION_REGISTRY_PATH
+        self.save_interval = config.SESSION_REGISTRY_SAVE_INTERVAL if save_interval is None else save_interval
+        self.lock = threading.Lock()
+        self.sessions = self._load()
+        self._dirty = False
+        self._saved_at = 0
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path) as f:
+                return json.load(f).get('sessions', {})
+        except (OSError, ValueError) as e:
+            print(f"Could not read session registry {self.path}: {str(e)}")
+            return {}
+
+    def entries(self):
+        """Copy of every registered session, oldest first"""
+        with self.lock:
+            entries = [dict(entry) for entry in self.sessions.values()]
+        return sorted(entries, key=lambda entry: entry.get('startedAt') or 0)
+
+    def get(self, session_id):
+        with self.lock:
+            entry = self.sessions.get(session_id)
+            return dict(entry) if entry else None
+
+    def put(self, session_id, sheet_url):
+        """Register a session, keeping what is known about it from earlier runs"""
+        with self.lock:
+            entry = self.sessions.get(session_id)
+            if entry is None or entry.get('sheetUrl') != sheet_url:
+                entry = {'sessionId': session_id, 'sheetUrl': sheet_url}
+            entry['startedAt'] = time.time()
+            self.sessions[session_id] = entry
+            self._save()
+
+    def update(self, session_id, **fields):
+        """Record progress for a registered session; written out lazily"""
+        with self.lock:
+            entry = self.sessions.get(session_id)
+            if entry is None:
+                return
+            entry.update(fields)
+            self._dirty = True
+            if time.monotonic() - self._saved_at >= self.save_interval:
+                self._save()
+
+    def remove(self, session_id):
+        with self.lock:
+            if self.sessions.pop(session_id, None) is not None:
+                self._save()
+
+    def flush(self):
+        """Write out batched updates"""
+        with self.lock:
+            if self._dirty:
+                self._save()
+
+    def _save(self):
+        """Caller holds the lock"""
+        try:
+            atomic_write(self.path, json.dumps({'sessions': self.sessions}, indent=2))
+            self._dirty = False
+            self._saved_at = time.monotonic()
+        except OSError as e:
+            print(f"Could not save session registry {self.path}: {str(e)}")
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_session_registry():
+    """Process-wide session registry, loaded on first use"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = SessionRegistry()
+        return _registry
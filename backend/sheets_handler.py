@@ -1,177 +1,648 @@
+import hashlib
+import json
 import re
-import os.path
+import threading
+import zlib
 from datetime import datetime
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
-# If modifying these scopes, delete the file token.json.
-SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
+import config
+from google_client import get_sheets_service, sheets_resources
+from products import as_record
+import metrics
+
+# Column label of each field in config.PRODUCT_FIELDS
+FIELD_LABELS = {
+    'itemId': 'Item ID',
+    'title': 'Title',
+    'coverImage': 'Cover Image',
+    'minPrice': 'Min Price',
+    'maxPrice': 'Max Price',
+    'productClicks': 'Product Clicks',
+    'ctr': 'CTR (%)',
+    'ordersCreated': 'Orders Created',
+    'itemsSold': 'Items Sold',
+    'revenue': 'Revenue'
+}
+
+# Product table columns: the fields in order, then the write timestamp
+HEADERS = [FIELD_LABELS.get(field, field) for field in config.PRODUCT_FIELDS] + ['Last Updated']
+
+SUMMARY_HEADERS = [
+    'Session ID',
+    'Products',
+    'Product Clicks',
+    'Orders Created',
+    'Items Sold',
+    'Revenue',
+    'Last Updated'
+]
+
+
+
+def _column_letter(number):
+    """A1 letter(s) of a 1-based column number"""
+    letters = ''
+    while number:
+        number, remainder = divmod(number - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+# Last column of a product row with its timestamp, and without it
+LAST_COLUMN = _column_letter(len(HEADERS))
+LAST_FIELD_COLUMN = _column_letter(len(HEADERS) - 1)
+SUMMARY_LAST_COLUMN = _column_letter(len(SUMMARY_HEADERS))
+
+# Bold white on blue, used for every header row
+HEADER_FORMAT = {
+    'backgroundColor': {
+        'red': 0.2,
+        'green': 0.6,
+        'blue': 0.9
+    },
+    'textFormat': {
+        'bold': True,
+        'foregroundColor': {
+            'red': 1.0,
+            'green': 1.0,
+            'blue': 1.0
+        }
+    }
+}
+
+
+def _header_format_request(sheet_id):
+    return {
+        'repeatCell': {
+            'range': {
+                'sheetId': sheet_id,
+                'startRowIndex': 0,
+                'endRowIndex': 1
+            },
+            'cell': {'userEnteredFormat': HEADER_FORMAT},
+            'fields': 'userEnteredFormat(backgroundColor,textFormat)'
+        }
+    }
+
+
+def extract_spreadsheet_id(url):
+    """Spreadsheet ID from a Google Sheets URL; ValueError if there is none"""
+    # Pattern: https://docs.google.com/spreadsheets/d/{SPREADSHEET_ID}/edit...
+    match = re.search(r'/spreadsheets/d/([a-zA-Z0-9-_]+)', url or '')
+    if match:
+        return match.group(1)
+    raise ValueError("Invalid Google Sheets URL")
+
+
+def _execute(writer, method, request):
+    """
+    Run a synchronous Sheets request, through the write queue's rate limit
+    and 429/5xx backoff when there is a queue
+    """
+    if writer is not None:
+        return writer.execute(method, request)
+    with metrics.sheets_call(method):
+        return request.execute()
+
+
+def _quote(title):
+    """A1 prefix for a worksheet title"""
+    return "'" + title.replace("'", "''") + "'!"
+
+
+class SpreadsheetLayout:
+    """
+    Worksheets of one spreadsheet, shared by every handler writing to it
+    Tabs are listed once and missing ones are created together in a single
+    batchUpdate; rows on the shared summary tab are handed out per session
+    """
+
+    def __init__(self, spreadsheet_id):
+        self.spreadsheet_id = spreadsheet_id
+        self.lock = threading.Lock()
+        # title -> sheetId, loaded on first use
+        self.sheets = None
+        # summary tab title -> {session_id: row number}
+        self.summary_rows = {}
+
+    def _load_sheets(self, spreadsheets, writer):
+        """List the spreadsheet's tabs into self.sheets; caller holds the lock"""
+        result = _execute(writer, 'get', spreadsheets.get(
+            spreadsheetId=self.spreadsheet_id,
+            fields='sheets.properties(sheetId,title)'
+        ))
+        self.sheets = {
+            sheet['properties']['title']: sheet['properties']['sheetId']
+            for sheet in result.get('sheets', [])
+        }
+
+    def _add_sheets(self, spreadsheets, titles, writer):
+        """Create the titled tabs in one batchUpdate; caller holds the lock"""
+        requests = []
+        for title in titles:
+            sheet_id = zlib.crc32(title.encode()) & 0x7fffffff
+            requests.append({'addSheet': {'properties': {
+                'title': title,
+                'sheetId': sheet_id,
+                'gridProperties': {'frozenRowCount': 1}
+            }}})
+            requests.append(_header_format_request(sheet_id))
+        result = _execute(writer, 'batchUpdate', spreadsheets.batchUpdate(
+            spreadsheetId=self.spreadsheet_id,
+            body={'requests': requests}
+        ))
+        for reply in result.get('replies', []):
+            if 'addSheet' in reply:
+                properties = reply['addSheet']['properties']
+                self.sheets[properties['title']] = properties['sheetId']
+
+    def ensure_tabs(self, spreadsheets, tabs, writer=None):
+        """
+        Create the tabs (title -> header row) that don't exist yet
+        Returns header ranges for the new tabs, to send with the first data write
+        """
+        with self.lock:
+            if self.sheets is None:
+                self._load_sheets(spreadsheets, writer)
+            
+            missing = [title for title in tabs if title not in self.sheets]
+            if not missing:
+                return []
+            
+            try:
+                self._add_sheets(spreadsheets, missing, writer)
+            except HttpError as e:
+                # The cached list is stale: another process added the tabs
+                # first, or one was renamed or deleted by hand
+                print(f"Error creating worksheets in {self.spreadsheet_id}, listing them again: {str(e)}")
+                self._load_sheets(spreadsheets, writer)
+                missing = [title for title in tabs if title not in self.sheets]
+                if not missing:
+                    return []
+                try:
+                    self._add_sheets(spreadsheets, missing, writer)
+                except HttpError as e:
+                    if 'already exists' not in str(e):
+                        raise
+                    # Lost the race again; whoever created them writes the headers
+                    self._load_sheets(spreadsheets, writer)
+                    missing = [title for title in missing if title not in self.sheets]
+                    if missing:
+                        raise
+                    return []
+            print(f"Created worksheets {', '.join(missing)} in {self.spreadsheet_id}")
+            return [{'range': f'{_quote(title)}A1', 'values': [tabs[title]]} for title in missing]
+
+    def forget(self):
+        """Drop the cached tabs and rows so they are read again on next use"""
+        with self.lock:
+            self.sheets = None
+            self.summary_rows = {}
+
+    def summary_row(self, values, title, session_id, writer=None):
+        """
+        Row of session_id on the summary tab
+        Column A is read again for each session not seen yet, so rows from
+        earlier runs and other processes are reused; a new session claims its
+        row with values.append, which the API places below the last used row
+        """
+        with self.lock:
+            rows = self.summary_rows.setdefault(title, {})
+            row = rows.get(session_id)
+            if row is not None:
+                return row
+            result = _execute(writer, 'values.get', values.get(
+                spreadsheetId=self.spreadsheet_id,
+                range=f'{_quote(title)}A2:A'
+            ))
+            for offset, found in enumerate(result.get('values', [])):
+                if found:
+                    rows.setdefault(str(found[0]), offset + 2)
+            row = rows.get(session_id)
+            if row is None:
+                result = _execute(writer, 'values.append', values.append(
+                    spreadsheetId=self.spreadsheet_id,
+                    range=f'{_quote(title)}A:A',
+                    valueInputOption='RAW',
+                    insertDataOption='OVERWRITE',
+                    body={'values': [[session_id]]}
+                ))
+                updated = result['updates']['updatedRange']
+                row = rows[session_id] = int(re.search(r'![A-Z]+(\d+)', updated).group(1))
+            return row
+
+
+_layouts = {}
+_layouts_lock = threading.Lock()
+
+
+def get_layout(spreadsheet_id):
+    """Process-wide layout for a spreadsheet"""
+    with _layouts_lock:
+        layout = _layouts.get(spreadsheet_id)
+        if layout is None:
+            layout = _layouts[spreadsheet_id] = SpreadsheetLayout(spreadsheet_id)
+        return layout
+
 
 class GoogleSheetsHandler:
     """Handler for Google Sheets API operations"""
     
-    def __init__(self, sheet_url):
+    def __init__(self, sheet_url, writer=None, service=None, session_id=None, destinations=None):
+        """
+        With a session_id, results go to that session's own worksheets, one per
+        destination in SHEET_DESTINATIONS ('live', 'history', 'summary');
+        without one, the product table is written to the first worksheet
+        """
         self.sheet_url = sheet_url
+        # Shared write-behind queue; None writes synchronously
+        self.writer = writer
         self.spreadsheet_id = self._extract_spreadsheet_id(sheet_url)
-        self.service = None
-        self._authenticate()
+        self.service = service
+        self.session_id = session_id
+        if session_id is None:
+            self.destinations = ['live']
+            self.tabs = {}
+        else:
+            self.destinations = list(destinations or config.SHEET_DESTINATIONS)
+            self.tabs = {
+                destination: config.SHEET_TABS[destination].format(session_id=session_id)
+                for destination in self.destinations
+            }
+        self.layout = get_layout(self.spreadsheet_id)
+        # Rows already in the live tab: key -> (row number, values without timestamp)
+        self._rows = {}
+        self._next_row = 2
+        self._history_row = 2
+        self._prepared = False
+        # Sequence of the last delta written; None until one was, or after a reset
+        self._sequence = None
+        if self.service is None:
+            self._authenticate()
+        self._spreadsheets, self._values = sheets_resources(self.service)
     
     def _extract_spreadsheet_id(self, url):
         """Extract spreadsheet ID from Google Sheets URL"""
-        # Pattern: https://docs.google.com/spreadsheets/d/{SPREADSHEET_ID}/edit...
-        match = re.search(r'/spreadsheets/d/([a-zA-Z0-9-_]+)', url)
-        if match:
-            return match.group(1)
-        raise ValueError("Invalid Google Sheets URL")
+        return extract_spreadsheet_id(url)
     
     def _authenticate(self):
-        """Authenticate with Google Sheets API"""
-        creds = None
-        
-        # The file token.json stores the user's access and refresh tokens
-        if os.path.exists('token.json'):
-            creds = Credentials.from_authorized_user_file('token.json', SCOPES)
-        
-        # If there are no (valid) credentials available, let the user log in
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            else:
-                if not os.path.exists('credentials.json'):
-                    raise FileNotFoundError(
-                        "credentials.json not found. Please download it from Google Cloud Console."
-                    )
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    'credentials.json', SCOPES
-                )
-                creds = flow.run_local_server(port=0)
-            
-            # Save the credentials for the next run
-            with open('token.json', 'w') as token:
-                token.write(creds.to_json())
-        
-        self.service = build('sheets', 'v4', credentials=creds)
+        """Use the process-wide Sheets service; auth and discovery happen once"""
+        self.service = get_sheets_service()
     
     def update_products(self, products):
         """
         Update product data in Google Sheets
-        Creates headers if they don't exist
+        Creates worksheets and headers if they don't exist
+        Only rows whose values changed since the last write are sent, and
+        every destination goes out in one values.batchUpdate. Products
+        missing from the list are removed from the live tab
+        """
+        self._sequence = None
+        return self._update(products, products)
+    
+    def apply_delta(self, delta):
+        """
+        Write a ChangeDetector delta: only its added and changed products
+        are compared against the sheet and its removed keys dropped. If a
+        delta was missed (a gap in delta.sequence), after a restart or a
+        dropped write, the full product list is compared instead
+        """
+        if not delta:
+            return True
+        incremental = (self._rows and self._sequence is not None
+                       and delta.sequence == self._sequence + 1)
+        if incremental:
+            written = self._update(delta.touched, delta.products, delta.removed)
+        else:
+            written = self._update(delta.products, delta.products)
+        self._sequence = delta.sequence if written else None
+        return written
+    
+    def _update(self, candidates, products, removed=None):
+        """
+        Send the candidates that differ from the sheet; products feed the summary row
+        removed lists keys to drop; with None, candidates is the full product
+        list and every key not in it is dropped
         """
         try:
-            # Prepare headers
-            headers = [
-                'Item ID',
-                'Title',
-                'Cover Image',
-                'Min Price',
-                'Max Price',
-                'Product Clicks',
-                'CTR (%)',
-                'Orders Created',
-                'Items Sold',
-                'Revenue',
-                'Last Updated'
-            ]
+            # Worksheets, headers and append positions (once per handler)
+            data = [] if self._prepared else self._prepare()
             
-            # Check if sheet has headers
-            result = self.service.spreadsheets().values().get(
-                spreadsheetId=self.spreadsheet_id,
-                range='A1:K1'
-            ).execute()
+            # Collect rows that are new or changed since the last write
+            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            first_write = not self._rows
+            candidates = [as_record(product) for product in candidates]
+            if removed is None:
+                current = {product.key for product in candidates}
+                removed = [key for key in self._rows if key not in current]
+            rows, next_row, moved = self._compact(removed, timestamp)
+            changed = {}
             
-            values = result.get('values', [])
+            for product in candidates:
+                key = product.key
+                values = product.to_row()
+                existing = rows.get(key)
+                
+                if existing is None:
+                    row_number = next_row
+                    next_row += 1
+                elif existing[1] != values:
+                    row_number = existing[0]
+                else:
+                    continue
+                
+                rows[key] = (row_number, values)
+                changed[row_number] = values + [timestamp]
             
-            # If no headers, add them
-            if not values:
-                self._write_headers(headers)
+            # Rows vacated by removals and not refilled above are blanked
+            for row_number in range(next_row, self._next_row):
+                if row_number not in changed:
+                    moved[row_number] = [''] * len(HEADERS)
             
-            # Prepare product data rows
-            rows = []
-            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            
-            for product in products:
-                row = [
-                    str(product.get('itemId', '')),
-                    product.get('title', ''),
-                    product.get('coverImage', ''),
-                    product.get('minPrice', 0),
-                    product.get('maxPrice', 0),
-                    product.get('productClicks', 0),
-                    product.get('ctr', 0),
-                    product.get('ordersCreated', 0),
-                    product.get('itemsSold', 0),
-                    product.get('revenue', 0),
-                    timestamp
-                ]
-                rows.append(row)
-            
-            # Clear existing data (except headers)
-            self.service.spreadsheets().values().clear(
-                spreadsheetId=self.spreadsheet_id,
-                range='A2:K'
-            ).execute()
+            history_row = self._history_row
+            if changed or moved:
+                if 'live' in self.destinations:
+                    data.extend(self._merge_ranges({**moved, **changed}, self._prefix('live')))
+                if 'history' in self.destinations:
+                    block = [changed[row_number] for row_number in sorted(changed)]
+                    data.append({
+                        'range': f"{self._prefix('history')}A{history_row}:{LAST_COLUMN}{history_row + len(block) - 1}",
+                        'values': block
+                    })
+                    history_row += len(block)
+                if 'summary' in self.destinations:
+                    data.append(self._summary_range(products, timestamp))
             
-            # Write new data
-            if rows:
-                body = {'values': rows}
-                self.service.spreadsheets().values().update(
+            if data and self.writer and not first_write:
+                # Queued writes are merged with other sessions on this spreadsheet
+                self.writer.submit(
+                    self._values,
+                    self.spreadsheet_id,
+                    self,
+                    data,
+                    on_failure=self.reset_snapshot
+                )
+            elif data:
+                body = {
+                    'valueInputOption': 'RAW',
+                    'data': data
+                }
+                _execute(self.writer, 'values.batchUpdate', self._values.batchUpdate(
                     spreadsheetId=self.spreadsheet_id,
-                    range='A2',
-                    valueInputOption='RAW',
                     body=body
-                ).execute()
+                ))
+            
+            if first_write and 'live' in self.destinations:
+                # Drop rows left over from a previous run, after the new data is in place
+                _execute(self.writer, 'values.clear', self._values.clear(
+                    spreadsheetId=self.spreadsheet_id,
+                    range=f"{self._prefix('live')}A{next_row}:{LAST_COLUMN}"
+                ))
             
-            print(f"Updated {len(rows)} products in Google Sheets")
+            self._rows = rows
+            self._next_row = next_row
+            self._history_row = history_row
+            
+            if removed:
+                print(f"Updated {len(changed)} and removed {len(removed)} of "
+                      f"{len(products)} products in Google Sheets")
+            else:
+                print(f"Updated {len(changed)} of {len(products)} products in Google Sheets")
             return True
             
         except HttpError as error:
             print(f"An error occurred: {error}")
+            # A tab may have been renamed or deleted; list them again next time
+            self._prepared = False
+            if self.tabs:
+                self.layout.forget()
+            return False
+    
+    def _compact(self, removed, timestamp):
+        """
+        Drop removed keys from a copy of the snapshot, moving the last rows
+        up into the gaps so the live tab stays contiguous
+        Returns (rows, next_row, moved) with moved rows to rewrite by row number
+        """
+        rows = dict(self._rows)
+        holes = sorted(rows.pop(key)[0] for key in removed if key in rows)
+        next_row = self._next_row - len(holes)
+        moved = {}
+        if not holes:
+            return rows, next_row, moved
+        
+        gaps = [row_number for row_number in holes if row_number < next_row]
+        tail = sorted((row_number, key) for key, (row_number, _) in rows.items()
+                      if row_number >= next_row)
+        for row_number, (_, key) in zip(gaps, tail):
+            values = rows[key][1]
+            rows[key] = (row_number, values)
+            moved[row_number] = values + [timestamp]
+        return rows, next_row, moved
+    
+    def _prefix(self, destination):
+        """A1 prefix of a destination's worksheet; '' for the first worksheet"""
+        title = self.tabs.get(destination)
+        return _quote(title) if title else ''
+    
+    def _prepare(self):
+        """
+        Make sure the worksheets and headers exist and find the end of the
+        history tab; returns header ranges still to be written
+        """
+        header_data = []
+        if not self.tabs:
+            # Check if sheet has headers
+            result = _execute(self.writer, 'values.get', self._values.get(
+                spreadsheetId=self.spreadsheet_id,
+                range=f'A1:{LAST_COLUMN}1'
+            ))
+            
+            # If no headers, add them
+            if not result.get('values', []):
+                self._write_headers(HEADERS)
+        else:
+            wanted = {
+                title: SUMMARY_HEADERS if destination == 'summary' else HEADERS
+                for destination, title in self.tabs.items()
+            }
+            header_data = self.layout.ensure_tabs(self._spreadsheets, wanted, self.writer)
+            created = {entry['range'] for entry in header_data}
+            
+            history = self.tabs.get('history')
+            if history and f'{_quote(history)}A1' not in created:
+                # Keep appending below rows written by earlier runs
+                result = _execute(self.writer, 'values.get', self._values.get(
+                    spreadsheetId=self.spreadsheet_id,
+                    range=f'{_quote(history)}A:A'
+                ))
+                self._history_row = max(2, len(result.get('values', [])) + 1)
+        
+        self._prepared = True
+        return header_data
+    
+    def _summary_range(self, products, timestamp):
+        """This session's totals row on the shared summary tab"""
+        title = self.tabs['summary']
+        row = self.layout.summary_row(self._values, title, self.session_id, self.writer)
+        totals = [0, 0, 0, 0]
+        for product in products:
+            totals[0] += product.get('productClicks') or 0
+            totals[1] += product.get('ordersCreated') or 0
+            totals[2] += product.get('itemsSold') or 0
+            totals[3] += product.get('revenue') or 0
+        return {
+            'range': f'{_quote(title)}A{row}:{SUMMARY_LAST_COLUMN}{row}',
+            'values': [[self.session_id, len(products)] + totals + [timestamp]]
+        }
+    
+    def reset_snapshot(self):
+        """Forget what was written so the next update rewrites every row"""
+        self._prepared = False
+        self._rows = {}
+        self._next_row = 2
+        self._sequence = None
+        if self.tabs:
+            self.layout.forget()
+    
+    def snapshot_hash(self):
+        """Fingerprint of the rows this handler believes are in the sheet"""
+        return self._hash_rows(self._rows)
+    
+    def restore_snapshot(self, expected_hash):
+        """
+        Rebuild the snapshot from the sheet after a restart
+        The rows are only trusted if they hash to expected_hash, i.e. the
+        sheet still holds exactly what was last written; otherwise the next
+        update rewrites every row as usual. Returns True if restored
+        """
+        if not expected_hash or 'live' not in self.destinations:
+            return False
+        try:
+            result = _execute(self.writer, 'values.get', self._values.get(
+                spreadsheetId=self.spreadsheet_id,
+                range=f"{self._prefix('live')}A2:{LAST_FIELD_COLUMN}",
+                valueRenderOption='UNFORMATTED_VALUE'
+            ))
+        except HttpError as error:
+            print(f"Could not read sheet to restore snapshot: {error}")
             return False
+        
+        rows = {}
+        for offset, values in enumerate(result.get('values', [])):
+            values = (list(values) + [''] * len(HEADERS))[:len(HEADERS) - 1]
+            key = str(values[0]) if values[0] != '' else values[1]
+            rows[key] = (offset + 2, values)
+        
+        if self._hash_rows(rows) != expected_hash:
+            return False
+        self._rows = rows
+        self._next_row = len(rows) + 2
+        return True
+    
+    def _hash_rows(self, rows):
+        """Hash row numbers and values, ignoring int/float and None/'' differences"""
+        def normalize(value):
+            if value is None:
+                return ''
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                return float(value)
+            return str(value)
+        
+        snapshot = sorted(
+            (row_number, [normalize(value) for value in values])
+            for row_number, values in rows.values()
+        )
+        return hashlib.sha1(json.dumps(snapshot).encode()).hexdigest()
+    
+    def _merge_ranges(self, changed, prefix=''):
+        """Group changed rows into contiguous full-width ranges for one batchUpdate"""
+        data = []
+        start = previous = None
+        block = []
+        for row_number in sorted(changed):
+            if previous is not None and row_number != previous + 1:
+                data.append({'range': f'{prefix}A{start}:{LAST_COLUMN}{previous}', 'values': block})
+                block = []
+                start = None
+            if start is None:
+                start = row_number
+            block.append(changed[row_number])
+            previous = row_number
+        if block:
+            data.append({'range': f'{prefix}A{start}:{LAST_COLUMN}{previous}', 'values': block})
+        return data
     
     def _write_headers(self, headers):
         """Write headers to the first row"""
         body = {'values': [headers]}
-        self.service.spreadsheets().values().update(
+        _execute(self.writer, 'values.update', self._values.update(
             spreadsheetId=self.spreadsheet_id,
             range='A1',
             valueInputOption='RAW',
             body=body
-        ).execute()
+        ))
         
         # Format headers (bold, background color)
-        requests = [{
-            'repeatCell': {
-                'range': {
-                    'sheetId': 0,
-                    'startRowIndex': 0,
-                    'endRowIndex': 1
-                },
-                'cell': {
-                    'userEnteredFormat': {
-                        'backgroundColor': {
-                            'red': 0.2,
-                            'green': 0.6,
-                            'blue': 0.9
-                        },
-                        'textFormat': {
-                            'bold': True,
-                            'foregroundColor': {
-                                'red': 1.0,
-                                'green': 1.0,
-                                'blue': 1.0
-                            }
-                        }
-                    }
-                },
-                'fields': 'userEnteredFormat(backgroundColor,textFormat)'
-            }
-        }]
-        
-        body = {'requests': requests}
-        self.service.spreadsheets().batchUpdate(
+        body = {'requests': [_header_format_request(0)]}
+        _execute(self.writer, 'batchUpdate', self._spreadsheets.batchUpdate(
             spreadsheetId=self.spreadsheet_id,
             body=body
-        ).execute()
+        ))
+
+
+class SheetTableWriter:
+    """
+    Keeps one named worksheet filled with a whole table, e.g. the shop-wide
+    summary; the tab is created on the first write
+    Tables are expected to only grow, so after the first write (which also
+    clears leftovers from earlier runs) a write is a single queued range
+    """
+    
+    def __init__(self, sheet_url, title, headers, writer=None, service=None):
+        self.spreadsheet_id = extract_spreadsheet_id(sheet_url)
+        self.title = title
+        self.headers = headers
+        self.writer = writer
+        self.service = service or get_sheets_service()
+        self.layout = get_layout(self.spreadsheet_id)
+        self._spreadsheets, self._values = sheets_resources(self.service)
+        self._written = False
+    
+    def write_rows(self, rows):
+        """Write rows below the header row; returns False on an API error"""
+        prefix = _quote(self.title)
+        last_column = _column_letter(len(self.headers))
+        try:
+            data = self.layout.ensure_tabs(self._spreadsheets, {self.title: self.headers}, self.writer)
+            if rows:
+                data.append({
+                    'range': f'{prefix}A2:{last_column}{len(rows) + 1}',
+                    'values': rows
+                })
+            
+            if self.writer and self._written:
+                self.writer.submit(self._values, self.spreadsheet_id, self, data,
+                                   on_failure=self.reset)
+                return True
+            
+            if data:
+                _execute(self.writer, 'values.batchUpdate', self._values.batchUpdate(
+                    spreadsheetId=self.spreadsheet_id,
+                    body={'valueInputOption': 'RAW', 'data': data}
+                ))
+            _execute(self.writer, 'values.clear', self._values.clear(
+                spreadsheetId=self.spreadsheet_id,
+                range=f'{prefix}A{len(rows) + 2}:{last_column}'
+            ))
+            self._written = True
+            return True
+            
+        except HttpError as error:
+            print(f"An error occurred writing {self.title}: {error}")
+            return False
+    
+    def reset(self):
+        """Write synchronously (and clear leftovers) again next time"""
+        self._written = False
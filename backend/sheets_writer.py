@@ -0,0 +1,274 @@
+import random
+import threading
+import time
+from googleapiclient.errors import HttpError
+
+import config
+import metrics
+
+
+class TokenBucket:
+    """Token-bucket rate limiter matching the Sheets per-minute write quota"""
+
+    def __init__(self, per_minute, capacity):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self):
+        """Seconds until a token is available"""
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def try_acquire(self):
+        """Take a token if one is available"""
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class _PendingBatch:
+    """Writes waiting to be sent for one spreadsheet"""
+
+    def __init__(self, resource):
+        # spreadsheets().values() resource used to send the batch
+        self.resource = resource
+        # range -> (session key, values); insertion order is write order
+        self.ranges = {}
+        self.callbacks = {}
+        self.attempts = 0
+        self.not_before = 0
+
+    def add(self, session_key, data, on_failure):
+        for entry in data:
+            # Re-insert so the newest write for a range is applied last
+            self.ranges.pop(entry['range'], None)
+            self.ranges[entry['range']] = (session_key, entry['values'])
+        if on_failure:
+            self.callbacks[session_key] = on_failure
+
+
+class SheetsWriteQueue:
+    """
+    Write-behind queue shared by every GoogleSheetsHandler
+    Pending writes are merged per spreadsheet into one values.batchUpdate,
+    sent through a token bucket, and retried with backoff on 429 and 5xx
+    """
+
+    def __init__(self, requests_per_minute=None, burst=None, max_retries=None,
+                 retry_delay=None, max_backoff=None):
+        self.bucket = TokenBucket(
+            requests_per_minute or config.SHEETS_WRITE_REQUESTS_PER_MINUTE,
+            burst or config.SHEETS_WRITE_BURST
+        )
+        self.max_retries = config.MAX_RETRIES if max_retries is None else max_retries
+        self.retry_delay = retry_delay or config.RETRY_DELAY
+        self.max_backoff = max_backoff or config.MAX_RETRY_DELAY
+
+        self.pending = {}
+        self.in_flight = 0
+        self.condition = threading.Condition()
+        self.stopping = False
+        self.thread = None
+        self.stats = {'batches': 0, 'ranges': 0, 'retries': 0, 'quotaErrors': 0, 'dropped': 0}
+
+    def start(self):
+        """Start the background writer thread"""
+        with self.condition:
+            if self.thread is not None:
+                return
+            self.stopping = False
+            self.thread = threading.Thread(target=self._loop, name='sheets-writer', daemon=True)
+            self.thread.start()
+
+    def submit(self, resource, spreadsheet_id, session_key, data, on_failure=None):
+        """
+        Queue value ranges for a spreadsheet, sent with the given
+        spreadsheets().values() resource
+        Newer writes to the same range replace older pending ones, so a slow
+        spreadsheet only ever holds the latest values per session
+        on_failure is called with no arguments if the write is finally dropped
+        """
+        if not data:
+            return
+        self.start()
+        with self.condition:
+            batch = self.pending.get(spreadsheet_id)
+            if batch is None:
+                batch = self.pending[spreadsheet_id] = _PendingBatch(resource)
+            batch.resource = resource
+            batch.add(session_key, data, on_failure)
+            self.condition.notify_all()
+
+    def flush(self, timeout=None):
+        """Wait until everything queued so far has been sent or dropped"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while self.pending or self.in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining if remaining is not None else 1)
+            return True
+
+    def stop(self, timeout=None):
+        """Flush pending writes, then stop the writer thread"""
+        self.flush(timeout)
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+            thread = self.thread
+            self.thread = None
+        if thread is not None:
+            thread.join(timeout=1)
+
+    def execute(self, method, request):
+        """
+        Run one synchronous request (tab creation, header and snapshot reads,
+        first writes) under the same token bucket as queued writes, retrying
+        429 and 5xx with the same backoff; raises once retries run out
+        """
+        attempts = 0
+        while True:
+            self._take_token()
+            try:
+                with metrics.sheets_call(method):
+                    return request.execute()
+            except HttpError as error:
+                status = error.resp.status
+                if status == 429:
+                    self.stats['quotaErrors'] += 1
+                if not (status == 429 or status >= 500) or attempts >= self.max_retries:
+                    raise
+                print(f"Sheets {method} failed with HTTP {status}, retrying")
+            attempts += 1
+            self.stats['retries'] += 1
+            time.sleep(min(self.retry_delay * 2 ** (attempts - 1), self.max_backoff)
+                       + random.uniform(0, 1))
+
+    def _take_token(self):
+        while not self.bucket.try_acquire():
+            time.sleep(self.bucket.wait_time())
+
+    def collect_metrics(self):
+        """Write queue gauges for /metrics"""
+        with self.condition:
+            pending = sum(len(batch.ranges) for batch in self.pending.values())
+        yield ('letu_sheets_queue_pending_ranges', 'Ranges waiting to be written', 'gauge',
+               [({}, pending)])
+        for key, name in (('batches', 'letu_sheets_queue_batches_total'),
+                          ('retries', 'letu_sheets_queue_retries_total'),
+                          ('dropped', 'letu_sheets_queue_dropped_total')):
+            yield (name, f'Write queue {key} since start', 'counter', [({}, self.stats[key])])
+
+    def _next_ready(self):
+        """Pick the spreadsheet that has waited longest; caller holds the condition"""
+        now = time.monotonic()
+        ready = [(batch.not_before, sid) for sid, batch in self.pending.items()
+                 if batch.not_before <= now]
+        if ready:
+            return min(ready)[1], 0
+        return None, min(batch.not_before for batch in self.pending.values()) - now
+
+    def _loop(self):
+        while True:
+            with self.condition:
+                while not self.stopping:
+                    if not self.pending:
+                        self.condition.wait()
+                        continue
+                    spreadsheet_id, wait = self._next_ready()
+                    if spreadsheet_id is None:
+                        self.condition.wait(wait)
+                        continue
+                    # Synchronous calls from execute() share the bucket
+                    if not self.bucket.try_acquire():
+                        self.condition.wait(self.bucket.wait_time())
+                        continue
+                    break
+                if self.stopping:
+                    return
+                batch = self.pending.pop(spreadsheet_id)
+                self.in_flight += 1
+
+            try:
+                self._send(spreadsheet_id, batch)
+            finally:
+                with self.condition:
+                    self.in_flight -= 1
+                    self.condition.notify_all()
+
+    def _send(self, spreadsheet_id, batch):
+        body = {
+            'valueInputOption': 'RAW',
+            'data': [{'range': r, 'values': values} for r, (_, values) in batch.ranges.items()]
+        }
+        try:
+            with metrics.sheets_call('values.batchUpdate'):
+                batch.resource.batchUpdate(
+                    spreadsheetId=spreadsheet_id,
+                    body=body
+                ).execute()
+            self.stats['batches'] += 1
+            self.stats['ranges'] += len(body['data'])
+            return
+        except HttpError as error:
+            status = error.resp.status
+            retryable = status == 429 or status >= 500
+            if status == 429:
+                self.stats['quotaErrors'] += 1
+            print(f"Sheets write for {spreadsheet_id} failed with HTTP {status}: {error}")
+        except Exception as e:
+            retryable = True
+            print(f"Sheets write for {spreadsheet_id} failed: {str(e)}")
+
+        batch.attempts += 1
+        if retryable and batch.attempts <= self.max_retries:
+            self.stats['retries'] += 1
+            self._requeue(spreadsheet_id, batch)
+        else:
+            self.stats['dropped'] += 1
+            for callback in batch.callbacks.values():
+                callback()
+
+    def _requeue(self, spreadsheet_id, batch):
+        """Put a failed batch back with backoff, beneath any newer writes"""
+        backoff = min(self.retry_delay * 2 ** (batch.attempts - 1), self.max_backoff)
+        with self.condition:
+            newer = self.pending.get(spreadsheet_id)
+            if newer is not None:
+                for range_name, entry in newer.ranges.items():
+                    batch.ranges.pop(range_name, None)
+                    batch.ranges[range_name] = entry
+                batch.callbacks.update(newer.callbacks)
+                batch.resource = newer.resource
+            batch.not_before = time.monotonic() + backoff + random.uniform(0, 1)
+            self.pending[spreadsheet_id] = batch
+            self.condition.notify_all()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """Process-wide Sheets write queue, created on first use"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = SheetsWriteQueue()
+            metrics.REGISTRY.add_collector(_writer.collect_metrics)
+        return _writer
@@ -0,0 +1,85 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+import config
+
+
+class AuthExpiredError(Exception):
+    """Raised when Shopee no longer accepts the cookies captured from the browser"""
+
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session():
+    """Process-wide requests session so all sessions share one connection pool"""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            adapter = HTTPAdapter(
+                pool_connections=config.HTTP_POOL_SIZE,
+                pool_maxsize=config.HTTP_POOL_SIZE
+            )
+            _http_session = requests.Session()
+            _http_session.mount('https://', adapter)
+            _http_session.mount('http://', adapter)
+        return _http_session
+
+
+class ProductListClient:
+    """Polls the productList JSON endpoint directly with cookies borrowed from the browser"""
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.urls = []
+        self.cookies = {}
+        self.headers = {}
+
+    def has_auth(self):
+        """True once cookies and the productList URLs have been captured"""
+        return bool(self.urls and self.cookies)
+
+    def load_auth(self, driver, urls, page_url):
+        """Copy cookies and browser headers from a driver that just loaded the dashboard"""
+        self.urls = list(urls)
+        self.cookies = {cookie['name']: cookie['value'] for cookie in driver.get_cookies()}
+        self.headers = {
+            'User-Agent': driver.execute_script('return navigator.userAgent'),
+            'Accept': 'application/json, text/plain, */*',
+            'Referer': page_url
+        }
+
+    def reset(self):
+        """Forget captured auth so the next cycle goes through the browser"""
+        self.urls = []
+        self.cookies = {}
+        self.headers = {}
+
+    def fetch(self, url):
+        """
+        Fetch one productList response body
+        Raises AuthExpiredError when the browser has to log in again
+        """
+        response = get_http_session().get(
+            url,
+            cookies=self.cookies,
+            headers=self.headers,
+            timeout=config.HTTP_TIMEOUT
+        )
+
+        if response.status_code in (401, 403):
+            raise AuthExpiredError(f"productList returned HTTP {response.status_code}")
+        response.raise_for_status()
+
+        try:
+            body = response.json()
+        except ValueError:
+            # Expired sessions get redirected to an HTML login page
+            raise AuthExpiredError("productList did not return JSON")
+
+        if body.get('code') not in (None, 0) or 'data' not in body:
+            raise AuthExpiredError(f"productList returned code {body.get('code')}")
+
+        return body
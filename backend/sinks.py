@@ -0,0 +1,389 @@
+"""
+Output sinks for scrape deltas
+Every sink runs on its own SinkWorker thread behind a bounded queue, so a
+slow sink (usually Sheets) never holds up the scrape cycle or the others.
+Local file sinks buffer rows per session and write them in batches, to
+files rotated by size and age.
+"""
+
+import csv
+import json
+import os
+import queue
+import re
+import threading
+import time
+
+import config
+import metrics
+from products import TEXT_FIELDS, json_default
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # The parquet sink is unavailable without pyarrow
+    pyarrow = None
+
+# Columns of every local file row
+COLUMNS = ['timestamp', 'sessionId'] + list(config.PRODUCT_FIELDS)
+
+_STOP = object()
+
+
+class Sink:
+    """
+    Where deltas end up. Methods are only called from the sink's own
+    SinkWorker thread, so implementations need no locking
+    """
+
+    name = None
+
+    def open_session(self, session_id, sheets_handler=None):
+        """A session started; sheets_handler is its GoogleSheetsHandler, if any"""
+
+    def write(self, session_id, delta):
+        raise NotImplementedError
+
+    def flush(self, force=False):
+        """Called every SINK_FLUSH_INTERVAL seconds, and with force=True on shutdown"""
+
+    def close_session(self, session_id):
+        """The session stopped; write out and release what is held for it"""
+
+    def close(self):
+        self.flush(force=True)
+
+
+class SinkWorker:
+    """Runs one sink on its own thread behind a bounded queue"""
+
+    def __init__(self, sink, queue_size=None, flush_interval=None):
+        self.sink = sink
+        self.flush_interval = flush_interval or config.SINK_FLUSH_INTERVAL
+        self.queue_size = queue_size or config.SINK_QUEUE_SIZE
+        # Deltas and session events in order; only deltas count towards queue_size,
+        # so session events and the stop marker never block the caller
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.pending = 0
+        # session_id -> merged delta held back while the queue is full
+        self.overflow = {}
+        self.thread = threading.Thread(target=self._run, name=f'sink-{sink.name}', daemon=True)
+        self.thread.start()
+
+    @property
+    def name(self):
+        return self.sink.name
+
+    def submit(self, session_id, delta):
+        """
+        Queue a delta without blocking
+        Once queue_size deltas are waiting, a session's further deltas are
+        merged into one held back until the queue has drained, so nothing is
+        lost and memory stays bounded by the number of sessions
+        """
+        with self.lock:
+            held = self.overflow.get(session_id)
+            if held is not None or self.pending >= self.queue_size:
+                self.overflow[session_id] = held.merge(delta) if held is not None else delta
+                metrics.SINK_COALESCED_TOTAL.inc(sink=self.name)
+                return
+            self.pending += 1
+            self.queue.put(('write', (session_id, delta)))
+
+    def open_session(self, session_id, sheets_handler=None):
+        self.queue.put(('open_session', (session_id, sheets_handler)))
+
+    def close_session(self, session_id):
+        with self.lock:
+            held = self.overflow.pop(session_id, None)
+            if held is not None:
+                # The session's last delta goes out before it is closed
+                self.pending += 1
+                self.queue.put(('write', (session_id, held)))
+            self.queue.put(('close_session', (session_id,)))
+
+    def _drain_overflow(self):
+        with self.lock:
+            held, self.overflow = self.overflow, {}
+        for session_id, delta in held.items():
+            self._call('write', (session_id, delta))
+
+    def _run(self):
+        next_flush = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self.queue.get(timeout=max(0, next_flush - time.monotonic()))
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                break
+            if item is not None:
+                self._call(*item)
+                if item[0] == 'write':
+                    with self.lock:
+                        self.pending -= 1
+            if self.overflow and self.queue.empty():
+                self._drain_overflow()
+            if time.monotonic() >= next_flush:
+                self._call('flush', ())
+                next_flush = time.monotonic() + self.flush_interval
+        self._drain_overflow()
+        self._call('close', ())
+
+    def _call(self, method, args):
+        started = time.perf_counter()
+        try:
+            getattr(self.sink, method)(*args)
+        except Exception as e:
+            metrics.SINK_ERRORS_TOTAL.inc(sink=self.name)
+            print(f"Error in {self.name} sink ({method}): {str(e)}")
+        finally:
+            if method == 'write':
+                metrics.SINK_WRITE_SECONDS.observe(time.perf_counter() - started, sink=self.name)
+
+
+class SheetsSink(Sink):
+    """
+    Hands deltas to each session's GoogleSheetsHandler
+    With a push_interval, only a session's latest products are kept and
+    pushed at most that often, so local sinks can record every scrape
+    while Sheets gets fewer writes
+    """
+
+    name = 'sheets'
+
+    def __init__(self, registry=None, push_interval=None):
+        self.registry = registry
+        self.push_interval = config.SHEETS_PUSH_INTERVAL if push_interval is None else push_interval
+        self.handlers = {}
+        # session_id -> latest products not pushed yet
+        self.pending = {}
+        self.pushed_at = {}
+
+    def open_session(self, session_id, sheets_handler=None):
+        if sheets_handler is not None:
+            self.handlers[session_id] = sheets_handler
+
+    def write(self, session_id, delta):
+        handler = self.handlers.get(session_id)
+        if handler is None:
+            return
+        if not self.push_interval:
+            handler.apply_delta(delta)
+            self._written(session_id, handler)
+            return
+        self.pending[session_id] = delta.products
+        if time.monotonic() - self.pushed_at.get(session_id, 0) >= self.push_interval:
+            self._push(session_id)
+
+    def flush(self, force=False):
+        now = time.monotonic()
+        for session_id in list(self.pending):
+            if force or now - self.pushed_at.get(session_id, 0) >= self.push_interval:
+                self._push(session_id)
+
+    def close_session(self, session_id):
+        if session_id in self.pending:
+            self._push(session_id)
+        self.handlers.pop(session_id, None)
+        self.pushed_at.pop(session_id, None)
+
+    def _push(self, session_id):
+        """Write a session's latest products; unchanged rows are skipped by the handler"""
+        products = self.pending.pop(session_id)
+        self.pushed_at[session_id] = time.monotonic()
+        handler = self.handlers.get(session_id)
+        if handler is not None:
+            handler.update_products(products)
+            self._written(session_id, handler)
+
+    def _written(self, session_id, handler):
+        if self.registry:
+            # Lets a restart trust the rows already in the sheet
+            self.registry.update(session_id, snapshotHash=handler.snapshot_hash())
+
+
+class FileSink(Sink):
+    """
+    Base for local file sinks
+    Every added or changed product becomes one row. Rows are buffered per
+    session and written every buffer_rows rows or SINK_FLUSH_INTERVAL
+    seconds, to <directory>/<sink>/<session>-<time>.<extension>; a new
+    file is started once the current one passes rotate_bytes or rotate_seconds
+    """
+
+    extension = None
+
+    def __init__(self, directory=None, buffer_rows=None, rotate_bytes=None, rotate_seconds=None):
+        self.directory = os.path.join(directory or config.SINK_DIRECTORY, self.name)
+        self.buffer_rows = buffer_rows or config.SINK_BUFFER_ROWS
+        self.rotate_bytes = rotate_bytes or config.SINK_ROTATE_BYTES
+        self.rotate_seconds = rotate_seconds or config.SINK_ROTATE_SECONDS
+        os.makedirs(self.directory, exist_ok=True)
+        # session_id -> [row, ...] not written yet
+        self.buffers = {}
+        # session_id -> {'handle', 'path', 'openedAt'}
+        self.files = {}
+
+    def write(self, session_id, delta):
+        rows = self.buffers.setdefault(session_id, [])
+        prefix = [delta.timestamp, session_id]
+        for record in delta.touched:
+            rows.append(dict(zip(COLUMNS, prefix + list(record.values()))))
+        if len(rows) >= self.buffer_rows:
+            self._write_out(session_id)
+
+    def flush(self, force=False):
+        for session_id in list(self.buffers):
+            self._write_out(session_id)
+
+    def close_session(self, session_id):
+        self._write_out(session_id)
+        entry = self.files.pop(session_id, None)
+        if entry:
+            self._close(entry['handle'])
+
+    def close(self):
+        for session_id in set(self.buffers) | set(self.files):
+            self.close_session(session_id)
+
+    def _write_out(self, session_id):
+        rows = self.buffers.pop(session_id, None)
+        if not rows:
+            return
+        entry = self.files.get(session_id)
+        if entry and self._needs_rotation(entry):
+            self._close(entry['handle'])
+            entry = None
+        if entry is None:
+            path = self._new_path(session_id)
+            entry = self.files[session_id] = {
+                'handle': self._open(path),
+                'path': path,
+                'openedAt': time.time()
+            }
+        self._write_rows(entry['handle'], rows)
+
+    def _needs_rotation(self, entry):
+        if time.time() - entry['openedAt'] >= self.rotate_seconds:
+            return True
+        try:
+            return os.path.getsize(entry['path']) >= self.rotate_bytes
+        except OSError:
+            return True
+
+    def _new_path(self, session_id):
+        safe_id = re.sub(r'[^A-Za-z0-9_-]', '_', str(session_id))
+        stem = os.path.join(self.directory, f"{safe_id}-{time.strftime('%Y%m%d-%H%M%S')}")
+        path = f'{stem}.{self.extension}'
+        n = 1
+        while os.path.exists(path):
+            path = f'{stem}-{n}.{self.extension}'
+            n += 1
+        return path
+
+    def _open(self, path):
+        raise NotImplementedError
+
+    def _write_rows(self, handle, rows):
+        raise NotImplementedError
+
+    def _close(self, handle):
+        handle.close()
+
+
+class JsonlSink(FileSink):
+    """One JSON object per line"""
+
+    name = 'jsonl'
+    extension = 'jsonl'
+
+    def _open(self, path):
+        return open(path, 'a', encoding='utf-8')
+
+    def _write_rows(self, handle, rows):
+        handle.write(''.join(json.dumps(row, ensure_ascii=False, default=json_default) + '\n'
+                             for row in rows))
+        handle.flush()
+
+
+class CsvSink(FileSink):
+    """CSV with a header row in every file"""
+
+    name = 'csv'
+    extension = 'csv'
+
+    def _open(self, path):
+        f = open(path, 'w', encoding='utf-8', newline='')
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        return f, writer
+
+    def _write_rows(self, handle, rows):
+        f, writer = handle
+        writer.writerows(rows)
+        f.flush()
+
+    def _close(self, handle):
+        handle[0].close()
+
+
+class ParquetSink(FileSink):
+    """Columnar Parquet; each buffered batch becomes one row group"""
+
+    name = 'parquet'
+    extension = 'parquet'
+
+    def __init__(self, *args, **kwargs):
+        if pyarrow is None:
+            raise ImportError("The parquet sink needs pyarrow (pip install pyarrow)")
+        super().__init__(*args, **kwargs)
+        fields = [('timestamp', pyarrow.string()), ('sessionId', pyarrow.string())]
+        for field in config.PRODUCT_FIELDS:
+            if field == 'itemId':
+                fields.append((field, pyarrow.int64()))
+            elif field in TEXT_FIELDS:
+                fields.append((field, pyarrow.string()))
+            else:
+                fields.append((field, pyarrow.float64()))
+        self.schema = pyarrow.schema(fields)
+
+    def _open(self, path):
+        return pyarrow.parquet.ParquetWriter(path, self.schema)
+
+    def _write_rows(self, handle, rows):
+        handle.write_table(pyarrow.Table.from_pylist(rows, schema=self.schema))
+
+
+SINK_TYPES = {
+    'sheets': SheetsSink,
+    'jsonl': JsonlSink,
+    'csv': CsvSink,
+    'parquet': ParquetSink
+}
+
+
+def create_sinks(names=None, registry=None):
+    """A running SinkWorker for each configured sink name"""
+    workers = []
+    for name in names if names is not None else config.OUTPUT_SINKS:
+        sink_type = SINK_TYPES.get(name)
+        if sink_type is None:
+            raise ValueError(f"Unknown output sink '{name}'")
+        sink = sink_type(registry=registry) if sink_type is SheetsSink else sink_type()
+        workers.append(SinkWorker(sink))
+    return workers
+
+
+def stop_sinks(workers, timeout=None):
+    """
+    Let every sink write what is queued, flush and close, in parallel and
+    within timeout seconds overall
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    for worker in workers:
+        worker.queue.put(_STOP)
+    for worker in workers:
+        remaining = None if deadline is None else max(0, deadline - time.monotonic())
+        worker.thread.join(remaining)
@@ -0,0 +1,450 @@
+import threading
+import time
+from datetime import datetime
+
+from scraper import ShopeeStreamScraper
+from browser_pool import get_pool
+from sheets_handler import GoogleSheetsHandler, extract_spreadsheet_id
+from sheets_writer import get_writer
+from history_store import get_history_store
+from live_feed import get_live_feed
+from aggregator import get_aggregator
+from scheduler import ScrapeScheduler, AdaptiveInterval, STOP
+from change_detector import ChangeDetector
+from failures import CircuitBreaker, classify
+from sinks import create_sinks, stop_sinks
+from broker import get_broker
+from session_registry import get_session_registry
+import config
+import metrics
+
+
+class SessionTracker:
+    """Owns every tracked session and runs its scrape cycles on the scheduler"""
+
+    def __init__(self, scheduler=None, writer=None, history=None, feed=None, registry=None,
+                 aggregator=None, sinks=None, persist=True, aggregate=True):
+        self.scheduler = scheduler or ScrapeScheduler()
+        self.writer = writer or get_writer()
+        self.history = history or get_history_store()
+        self.feed = feed or get_live_feed()
+        # Worker processes get their sessions from the broker and don't persist them
+        self.registry = (registry or get_session_registry()) if persist else None
+        # ...and leave shop-wide totals to the API process, which sees every worker
+        self.aggregator = (aggregator or get_aggregator()) if aggregate else None
+        # Outputs for changed scrapes, each on its own thread (OUTPUT_SINKS)
+        self.sinks = create_sinks(registry=self.registry) if sinks is None else sinks
+        self.uses_sheets = any(sink.name == 'sheets' for sink in self.sinks)
+        self.sessions = {}
+        # Sessions stopped because their stream ended, kept for /api/status
+        self.finished = {}
+        self.lock = threading.Lock()
+        metrics.REGISTRY.add_collector(self.collect_metrics)
+
+    def is_tracking(self, session_id):
+        with self.lock:
+            return session_id in self.sessions
+
+    def session_ids(self):
+        with self.lock:
+            return list(self.sessions)
+
+    def take_finished(self):
+        """Statuses of sessions that stopped on their own since the last call"""
+        with self.lock:
+            finished = self.finished
+            self.finished = {}
+        return finished
+
+    def start(self, session_id, sheet_url, snapshot_hash=None):
+        """
+        Create the scraper and sheets handler for a session and schedule it
+        snapshot_hash lets a resumed session trust what is already in its sheet
+        """
+        with self.lock:
+            if session_id in self.sessions:
+                raise ValueError('Already tracking this session')
+            self.finished.pop(session_id, None)
+            # Reserve the slot so concurrent requests can't start it twice
+            self.sessions[session_id] = {'running': False}
+
+        scraper = None
+        try:
+            # Check the sheet before leasing a browser tab for the scraper
+            sheets_handler = None
+            if self.uses_sheets:
+                sheets_handler = GoogleSheetsHandler(sheet_url, writer=self.writer, session_id=session_id)
+                if snapshot_hash and sheets_handler.restore_snapshot(snapshot_hash):
+                    print(f"Session {session_id} resumed with its existing sheet rows")
+            scraper = ShopeeStreamScraper(session_id)
+        except Exception:
+            if scraper is not None:
+                scraper.close()
+            with self.lock:
+                del self.sessions[session_id]
+            raise
+
+        with self.lock:
+            self.sessions[session_id] = {
+                'scraper': scraper,
+                'sheetUrl': sheet_url,
+                'running': True,
+                'lastUpdate': None,
+                'lastSuccess': None,
+                'startedAt': time.time(),
+                'productCount': 0,
+                'interval': AdaptiveInterval() if config.ADAPTIVE_INTERVAL else None,
+                'changes': ChangeDetector(session_id),
+                'breaker': CircuitBreaker()
+            }
+        for sink in self.sinks:
+            sink.open_session(session_id, sheets_handler)
+        if self.registry:
+            self.registry.put(session_id, sheet_url)
+        self.scheduler.add(session_id, lambda: self._run_cycle(session_id),
+                           on_stop=lambda: self._finish(session_id))
+
+    def resume(self, stagger=None):
+        """
+        Restart every session from the registry in a background thread
+        Launches are spaced by stagger seconds so a restart doesn't open
+        every Chrome tab and rewrite every sheet at once
+        """
+        if not self.registry:
+            return None
+        stagger = config.SESSION_RESUME_STAGGER if stagger is None else stagger
+        entries = self.registry.entries()
+        if not entries:
+            return None
+
+        def resume_all():
+            print(f"Resuming {len(entries)} tracked sessions")
+            for n, entry in enumerate(entries):
+                if n:
+                    time.sleep(stagger)
+                session_id = entry['sessionId']
+                try:
+                    self.start(session_id, entry['sheetUrl'], entry.get('snapshotHash'))
+                except ValueError:
+                    continue
+                except Exception as e:
+                    print(f"Error resuming session {session_id}: {str(e)}")
+
+        thread = threading.Thread(target=resume_all, name='session-resume', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self, session_id):
+        """Unschedule a session and give its browser tab back"""
+        with self.lock:
+            session = self.sessions.pop(session_id, None)
+        if session is None:
+            raise KeyError(session_id)
+
+        session['running'] = False
+        if self.registry:
+            self.registry.remove(session_id)
+        self.scheduler.remove(session_id, timeout=30)
+        for sink in self.sinks:
+            sink.close_session(session_id)
+        self.feed.close_session(session_id)
+        metrics.SESSION_LAST_CYCLE_SECONDS.remove(session=session_id)
+        if 'scraper' in session:
+            session['scraper'].close()
+
+    def status(self, session_id):
+        """Tracking status for a session"""
+        with self.lock:
+            session = self.sessions.get(session_id)
+        if session is None:
+            with self.lock:
+                finished = self.finished.get(session_id)
+            return finished or {'tracking': False}
+
+        status = {
+            'tracking': True,
+            'running': session['running'],
+            'lastUpdate': session.get('lastUpdate'),
+            'productCount': session.get('productCount', 0),
+            'viewers': self.feed.viewer_count(session_id)
+        }
+        schedule = self.scheduler.status(session_id)
+        if schedule:
+            status['nextRun'] = schedule['nextRun']
+        if session.get('breaker'):
+            breaker = session['breaker'].status()
+            status['failures'] = breaker['failures']
+            # The circuit keeps the last error after recovering; here it means "still failing"
+            status['lastError'] = breaker['lastError'] if breaker['failures'] else None
+            status['circuit'] = breaker
+        if session.get('interval'):
+            status['interval'] = round(session['interval'].interval, 1)
+        return status
+
+    def latest_products(self, session_id):
+        """Products from the session's last successful cycle, or None"""
+        with self.lock:
+            session = self.sessions.get(session_id)
+        if session is None:
+            return None
+        return session.get('lastProducts')
+
+    def shutdown(self, timeout=None):
+        """
+        Stop the scheduler, flush pending sheet writes and quit every browser,
+        all within timeout seconds
+        Running cycles get up to half the time to finish so their writes are
+        flushed; browsers are killed if they don't quit before the deadline
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        def remaining(share=1.0):
+            if deadline is None:
+                return None
+            return max(0, (deadline - time.monotonic()) * share)
+
+        self.scheduler.stop(timeout=remaining(0.5))
+        # Sinks hand their last rows to files and the Sheets queue before it is flushed
+        stop_sinks(self.sinks, timeout=remaining(0.3))
+        self.writer.stop(timeout=remaining(0.8))
+        if self.registry:
+            # Sessions stay registered so the next start resumes them
+            self.registry.flush()
+        with self.lock:
+            sessions = list(self.sessions.items())
+            self.sessions = {}
+            self.finished = {}
+
+        # The shared pool also holds tabs opened for previews
+        pools = [get_pool()]
+        for session_id, session in sessions:
+            session['running'] = False
+            scraper = session.get('scraper')
+            if scraper is not None and scraper.pool not in pools:
+                pools.append(scraper.pool)
+        for pool in pools:
+            # Closing the browsers drops every tab, so scrapers aren't released one by one
+            pool.shutdown(timeout=remaining())
+        for session_id, session in sessions:
+            if 'scraper' in session:
+                session['scraper'].lease = None
+
+    def collect_metrics(self):
+        """Per-session staleness and failure gauges for /metrics"""
+        now = time.time()
+        with self.lock:
+            sessions = list(self.sessions.items())
+
+        staleness = []
+        failures = []
+        circuits = []
+        for session_id, session in sessions:
+            if 'startedAt' not in session:
+                continue
+            last = session.get('lastSuccess') or session['startedAt']
+            staleness.append(({'session': session_id}, round(now - last, 3)))
+            breaker = session['breaker']
+            failures.append(({'session': session_id}, breaker.failures))
+            circuits.append(({'session': session_id}, 1 if breaker.state == 'open' else 0))
+
+        yield ('letu_sessions_tracked', 'Sessions currently tracked', 'gauge',
+               [({}, len(sessions))])
+        yield ('letu_session_staleness_seconds', 'Seconds since the last successful update',
+               'gauge', staleness)
+        yield ('letu_session_consecutive_failures', 'Consecutive failed cycles per session',
+               'gauge', failures)
+        yield ('letu_session_circuit_open', '1 while a session is paused by its circuit breaker',
+               'gauge', circuits)
+
+    def _run_cycle(self, session_id):
+        """
+        One scrape and sheet update for a session
+        Failures are counted by the session's circuit breaker, which picks the
+        retry delay; the scraper repairs its driver, tab or login before the
+        next attempt. While the circuit is open the session isn't scraped at all
+        """
+        session = self.sessions.get(session_id)
+        if not session or not session['running']:
+            return None
+
+        breaker = session['breaker']
+        if not breaker.allow():
+            return breaker.remaining()
+
+        started = time.perf_counter()
+        try:
+            result = self._scrape_and_write(session_id, session)
+        except Exception as e:
+            error = classify(e)
+            metrics.CYCLE_ERRORS_TOTAL.inc(kind=error.kind)
+            delay = breaker.record_failure(error)
+            if breaker.state == 'open':
+                print(f"Session {session_id} failed {breaker.failures} times ({error.kind}: "
+                      f"{breaker.last_error}), pausing for {delay:.0f}s")
+            else:
+                print(f"Session {session_id} failed ({error.kind}: {breaker.last_error}), "
+                      f"retrying in {delay:.0f}s")
+            try:
+                session['scraper'].recover(error)
+            except Exception as recover_error:
+                print(f"Error recovering session {session_id}: {str(recover_error)}")
+            return delay
+        finally:
+            duration = time.perf_counter() - started
+            metrics.CYCLE_SECONDS.observe(duration)
+            metrics.SESSION_LAST_CYCLE_SECONDS.set(round(duration, 3), session=session_id)
+
+        if breaker.record_success():
+            print(f"Session {session_id} recovered")
+        return result
+
+    def _scrape_and_write(self, session_id, session):
+        # Scrape products and work out what moved since the last cycle
+        products = session['scraper'].scrape_products()
+        delta = session['changes'].detect(products)
+
+        # Sinks only see cycles where something changed
+        if delta:
+            # Keep the metric trajectories and push them to live viewers
+            self.history.record(session_id, delta)
+            self.feed.publish(session_id, delta)
+            if self.aggregator:
+                self.aggregator.update(session_id, delta.touched)
+            
+            # Sheets and local files write on their own threads
+            for sink in self.sinks:
+                sink.submit(session_id, delta)
+            session['lastProducts'] = delta.products
+
+        if products:
+            session['lastUpdate'] = datetime.now().isoformat(timespec='seconds')
+            session['productCount'] = len(products)
+            session['lastSuccess'] = time.time()
+            if self.registry:
+                self.registry.update(session_id, lastSuccess=session['lastSuccess'],
+                                     productCount=len(products))
+
+        return self._next_interval(session, delta)
+
+    def _next_interval(self, session, delta):
+        """Delay before the next cycle, or STOP once the stream has ended"""
+        interval = session.get('interval')
+        if interval is None:
+            return None
+
+        delay = interval.observe(len(delta), len(delta.products))
+        if interval.finished():
+            return STOP
+        return delay
+
+    def _finish(self, session_id):
+        """Release a session the scheduler stopped because its stream ended"""
+        with self.lock:
+            session = self.sessions.pop(session_id, None)
+        if session is None:
+            return
+
+        print(f"Session {session_id} has not changed for "
+              f"{config.STREAM_END_IDLE_SECONDS}s, stopping")
+        session['running'] = False
+        if self.registry:
+            self.registry.remove(session_id)
+        for sink in self.sinks:
+            sink.close_session(session_id)
+        self.feed.close_session(session_id)
+        metrics.SESSION_LAST_CYCLE_SECONDS.remove(session=session_id)
+        if 'scraper' in session:
+            session['scraper'].close()
+        with self.lock:
+            self.finished[session_id] = {
+                'tracking': False,
+                'finished': True,
+                'lastUpdate': session.get('lastUpdate'),
+                'productCount': session.get('productCount', 0)
+            }
+
+
+class BrokerTracker:
+    """
+    SessionTracker stand-in for the API process in worker mode
+    Sessions are recorded in the broker and run by worker processes; results
+    are read back from the broker and relayed to local live viewers
+    """
+
+    def __init__(self, broker=None, feed=None, aggregator=None):
+        self.broker = broker or get_broker()
+        self.feed = feed or get_live_feed()
+        self.aggregator = aggregator or get_aggregator()
+        self._stopping = threading.Event()
+        self._relay = threading.Thread(target=self._relay_loop, name='live-feed-relay', daemon=True)
+        self._relay.start()
+
+    def is_tracking(self, session_id):
+        return self.broker.is_running(session_id)
+
+    def start(self, session_id, sheet_url):
+        """Queue a session for the least loaded worker"""
+        # Reject a bad URL here; the worker would only fail to start it
+        extract_spreadsheet_id(sheet_url)
+        worker_id = self.broker.submit(session_id, sheet_url)
+        if worker_id is None:
+            print(f"No live worker for session {session_id} yet, it will start once one heartbeats")
+
+    def stop(self, session_id):
+        self.broker.cancel(session_id)
+        self.feed.close_session(session_id)
+
+    def status(self, session_id):
+        session = self.broker.session(session_id)
+        if session is None or session['state'] == 'stopped':
+            return {'tracking': False}
+
+        status = dict(session['status'])
+        if session['state'] == 'finished':
+            status.update({'tracking': False, 'finished': True})
+            return status
+        if session['state'] == 'failed':
+            status.update({'tracking': False, 'failed': True, 'moves': session['moves']})
+            return status
+        status.update({
+            'tracking': True,
+            'running': True,
+            'worker': session['worker_id'],
+            'moves': session['moves'],
+            'viewers': self.feed.viewer_count(session_id)
+        })
+        status.setdefault('lastUpdate', None)
+        status.setdefault('productCount', 0)
+        return status
+
+    def latest_products(self, session_id):
+        session = self.broker.session(session_id)
+        if session is None or session['state'] != 'running':
+            return None
+        return session['products']
+
+    def workers(self):
+        return self.broker.workers()
+
+    def shutdown(self, timeout=None):
+        self._stopping.set()
+        self._relay.join(timeout=timeout)
+
+    def _relay_loop(self):
+        """Fold new worker results into shop totals and publish them to live viewers"""
+        seen = {}
+        detectors = {}
+        since = 0
+        while not self._stopping.wait(config.LIVE_FEED_RELAY_INTERVAL):
+            try:
+                for session_id, (updated, products) in self.broker.products_since(None, since).items():
+                    since = max(since, updated)
+                    if updated <= seen.get(session_id, 0):
+                        continue
+                    seen[session_id] = updated
+                    delta = detectors.setdefault(session_id, ChangeDetector(session_id)).detect(products)
+                    if delta:
+                        self.aggregator.update(session_id, delta.touched)
+                        self.feed.publish(session_id, delta)
+            except Exception as e:
+                print(f"Error relaying live feed: {str(e)}")
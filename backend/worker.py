@@ -0,0 +1,114 @@
+"""
+Scrape worker process for worker mode
+Heartbeats to the SQLite broker, runs the sessions assigned to it with its
+own browser pool and scheduler, and reports their status back to the API.
+
+Usage:
+    python worker.py
+    python worker.py --id worker-2 --capacity 20
+"""
+
+import argparse
+import os
+import signal
+import socket
+import threading
+
+import config
+from broker import get_broker
+from google_client import warm_up
+from tracker import SessionTracker
+
+
+class ScrapeWorker:
+    """Keeps the local SessionTracker in line with the broker's assignments"""
+
+    def __init__(self, worker_id=None, capacity=None, broker=None, tracker=None):
+        self.worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}'
+        self.capacity = capacity or config.WORKER_CAPACITY
+        self.broker = broker or get_broker()
+        self.tracker = tracker or SessionTracker(persist=False, aggregate=False)
+        self.stopping = threading.Event()
+        # session_id -> products list last sent to the broker
+        self._reported = {}
+
+    def run(self):
+        print(f"Worker {self.worker_id} started with capacity {self.capacity}")
+        while not self.stopping.is_set():
+            try:
+                self.reconcile()
+            except Exception as e:
+                print(f"Error syncing worker {self.worker_id}: {str(e)}")
+            self.stopping.wait(config.WORKER_HEARTBEAT_INTERVAL)
+        self.shutdown()
+
+    def reconcile(self):
+        """Heartbeat, start and stop sessions to match the assignment, report status"""
+        assigned = self.broker.heartbeat(self.worker_id, self.capacity)
+
+        for session_id, status in self.tracker.take_finished().items():
+            self.broker.finish(self.worker_id, session_id, status)
+            self._reported.pop(session_id, None)
+
+        local = set(self.tracker.session_ids())
+        for session_id in local - set(assigned):
+            print(f"Session {session_id} is no longer assigned to {self.worker_id}, stopping")
+            self._stop(session_id)
+
+        for session_id, sheet_url in assigned.items():
+            if session_id in local:
+                self._report(session_id)
+                continue
+            try:
+                self.tracker.start(session_id, sheet_url)
+                print(f"Worker {self.worker_id} started session {session_id}")
+            except Exception as e:
+                print(f"Error starting session {session_id}: {str(e)}")
+                self.broker.release(self.worker_id, session_id, str(e))
+
+    def _report(self, session_id):
+        status = self.tracker.status(session_id)
+        if status.get('failures', 0) >= config.WORKER_SESSION_MAX_FAILURES:
+            # Let another worker (and its browsers) try this session
+            print(f"Session {session_id} failed {status['failures']} times on "
+                  f"{self.worker_id}, handing it off")
+            self._stop(session_id)
+            self.broker.release(self.worker_id, session_id, status.get('lastError'))
+            return
+
+        products = self.tracker.latest_products(session_id)
+        if products is self._reported.get(session_id):
+            products = None
+        else:
+            self._reported[session_id] = products
+        self.broker.report(self.worker_id, session_id, status, products)
+
+    def _stop(self, session_id):
+        self._reported.pop(session_id, None)
+        try:
+            self.tracker.stop(session_id)
+        except KeyError:
+            pass
+
+    def shutdown(self):
+        """Stop every local session and let the broker move them right away"""
+        print(f"Worker {self.worker_id} shutting down")
+        self.tracker.shutdown(timeout=30)
+        self.broker.unregister(self.worker_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Letu Live Tracker scrape worker')
+    parser.add_argument('--id', help='worker id (default: host-pid)')
+    parser.add_argument('--capacity', type=int, help='maximum sessions on this worker')
+    args = parser.parse_args()
+
+    warm_up()
+    worker = ScrapeWorker(args.id, args.capacity)
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: worker.stopping.set())
+    worker.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,8 @@
+"""
+Production entry point
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+from app import app, start_services
+
+start_services()
@@ -12,6 +12,24 @@ function App() {
   const [success, setSuccess] = useState('');
   const [previewData, setPreviewData] = useState(null);
   const [isLoading, setIsLoading] = useState(false);
+  const [lastUpdate, setLastUpdate] = useState(null);
+
+  // Live product updates while tracking, pushed by the backend
+  useEffect(() => {
+    if (!isTracking || !sessionId) {
+      return undefined;
+    }
+
+    const source = new EventSource(`${API_BASE_URL}/stream/${sessionId}`);
+    source.addEventListener('update', (event) => {
+      const data = JSON.parse(event.data);
+      setPreviewData({ products: data.products, count: data.count });
+      setLastUpdate(data.timestamp);
+    });
+    source.addEventListener('end', () => source.close());
+
+    return () => source.close();
+  }, [isTracking, sessionId]);
 
   const handleStartTracking = async () => {
     setError('');
@@ -29,7 +47,7 @@ function App() {
         sheetUrl
       });
       
-      setSuccess('Tracking started! Data will be updated every 30 seconds.');
+      setSuccess('Tracking started! Data below updates live as the session is scraped.');
       setIsTracking(true);
     } catch (err) {
       setError(err.response?.data?.error || 'Failed to start tracking');
@@ -152,14 +170,17 @@ function App() {
           {isTracking && (
             <div className="tracking-status">
               <div className="pulse"></div>
-              <span>Tracking active - Updating every 30 seconds</span>
+              <span>
+                Tracking active - Updating live
+                {lastUpdate && ` (last update ${lastUpdate})`}
+              </span>
             </div>
           )}
         </div>
 
         {previewData && (
           <div className="card preview-card">
-            <h2>Preview Data ({previewData.count} products found)</h2>
+            <h2>{isTracking ? 'Live Data' : 'Preview Data'} ({previewData.count} products found)</h2>
             <div className="preview-list">
               {previewData.products.slice(0, 5).map((product, index) => (
                 <div key={index} className="preview-item">
@@ -185,7 +206,7 @@ function App() {
             <li>Create a Google Sheet and paste its URL</li>
             <li>Click "Preview Data" to test the connection</li>
             <li>Click "Start Tracking" to begin real-time updates</li>
-            <li>Your Google Sheet will update automatically every 30 seconds</li>
+            <li>Your Google Sheet will update automatically after each scrape</li>
           </ol>
         </div>
 